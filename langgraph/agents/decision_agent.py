@@ -2,19 +2,15 @@
 Decision Agent (Claude 4.5)
 Planning과 Research 결과를 분석하여 최종 의사결정 (추천/비추천)
 """
-from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import SystemMessage, HumanMessage
-from .state import AgentState
-import os
-import json
+from .state import AgentState, get_user_request
+from .llm import bound_model, extract_text, llm_semaphore, to_prompt_json
+import orjson
+import re
 
 
-# Claude 4.5 모델 초기화
-claude_decision = ChatAnthropic(
-    model="claude-sonnet-4-20250514",
-    api_key=os.getenv("ANTHROPIC_API_KEY"),
-    temperature=0.5
-)
+# 추천/비추천 판단에 약간의 다양성 허용
+DECISION_TEMPERATURE = 0.5
 
 
 DECISION_SYSTEM = """You are the Decision Agent.
@@ -70,29 +66,34 @@ Also output a JSON with decision:
 {"recommendation": "approve" or "reject", "tool_name": "..."}
 """
 
+DECISION_SYSTEM_MESSAGE = SystemMessage(content=DECISION_SYSTEM)
 
-def decision_node(state: AgentState) -> AgentState:
+# 응답 끝의 결정 JSON ({"recommendation": ...}) 추출용
+RECOMMENDATION_RE = re.compile(r'\{[^{}]*"recommendation"[^{}]*\}')
+
+
+async def decision_node(state: AgentState) -> AgentState:
     """
     Decision 노드: 최종 의사결정 (추천/비추천)
+    결과 JSON의 recommendation으로 Prompt Generator 실행 여부가 정해짐
     """
-    messages = state["messages"]
     task_plan = state.get("task_plan", {})
     research_data = state.get("research_data", {})
 
     # 입력 데이터 준비
-    plan_summary = json.dumps(task_plan, indent=2, ensure_ascii=False) if task_plan else "No plan available"
-    research_summary = json.dumps(research_data, indent=2, ensure_ascii=False) if research_data else "No research data"
+    plan_summary = to_prompt_json(task_plan) if task_plan else "No plan available"
+    research_summary = to_prompt_json(research_data) if research_data else "No research data"
 
     # 사용자 원래 요청
-    user_request = messages[0]["content"] if messages else "Deploy infrastructure"
+    user_request = get_user_request(state) or "Deploy infrastructure"
 
     print(f"\n{'='*80}")
     print(f"Decision Agent - Making final decision")
     print(f"{'='*80}")
 
     # Claude 호출
-    response = claude_decision.invoke([
-        SystemMessage(content=DECISION_SYSTEM),
+    prompt_messages = [
+        DECISION_SYSTEM_MESSAGE,
         HumanMessage(content=f"""분석 결과를 바탕으로 최종 의사결정을 내려주세요:
 
 **사용자 요청:** {user_request}
@@ -117,18 +118,19 @@ def decision_node(state: AgentState) -> AgentState:
 **중요**: 한국어로 작성하고, 사용자 친화적으로 작성해주세요.
 마지막에 JSON 형식으로 결정도 포함: {{"recommendation": "approve" or "reject", "tool_name": "..."}}
 """)
-    ])
+    ]
+    async with llm_semaphore:
+        response = await bound_model(DECISION_TEMPERATURE).ainvoke(prompt_messages)
 
-    content = response.content
+    content = extract_text(response)
 
     # 추천/비추천 판단 (JSON 파싱 시도)
     recommendation = "reject"  # 기본값
     try:
         if '{"recommendation"' in content or "```json" in content:
-            import re
-            json_match = re.search(r'\{[^{}]*"recommendation"[^{}]*\}', content)
+            json_match = RECOMMENDATION_RE.search(content)
             if json_match:
-                decision_json = json.loads(json_match.group(0))
+                decision_json = orjson.loads(json_match.group(0))
                 recommendation = decision_json.get("recommendation", "reject")
     except:
         # 텍스트 기반 판단
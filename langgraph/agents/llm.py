@@ -0,0 +1,93 @@
+"""
+LLM 공용 헬퍼
+"""
+from langchain_core.messages import SystemMessage
+from functools import lru_cache
+import asyncio
+import orjson
+import os
+
+
+SONNET_MODEL = "claude-sonnet-4-20250514"
+# 라우팅처럼 단순한 작업용 소형 모델 (Sonnet 대비 훨씬 저렴하고 빠름)
+HAIKU_MODEL = "claude-3-5-haiku-20241022"
+
+
+@lru_cache(maxsize=None)
+def chat_model(model: str = SONNET_MODEL):
+    """
+    모든 에이전트가 공유하는 Claude 클라이언트 (모델별로 하나만 생성)
+    인스턴스 하나가 Anthropic SDK 클라이언트(httpx 연결 풀)를 하나만 가지므로
+    에이전트 간 이동 시에도 keep-alive 연결을 재사용함
+    langchain_anthropic import와 클라이언트 생성은 처음 호출될 때로 미뤄 워커 기동을 빠르게 함
+    에이전트별 temperature는 bound_model(temperature)로 지정
+    """
+    from langchain_anthropic import ChatAnthropic
+    return ChatAnthropic(model=model, api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+
+@lru_cache(maxsize=None)
+def bound_model(temperature: float):
+    """
+    공유 Sonnet 클라이언트에 temperature를 바인딩한 Runnable (temperature별로 하나만 생성)
+    """
+    return chat_model().bind(temperature=temperature)
+
+
+# 동시에 진행되는 Anthropic 요청 수 제한
+# 여러 세션이 몰려도 요청이 한꺼번에 나가 rate limit(429) 재시도가 폭주하지 않도록 함
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+
+def cached_system_message(prompt: str) -> SystemMessage:
+    """
+    Anthropic prompt caching 대상으로 표시한 system 메시지
+    정적인 system 프롬프트는 캐시에서 읽혀 입력 토큰 비용과 TTFT가 줄어듦
+    """
+    return SystemMessage(content=[
+        {"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}
+    ])
+
+
+def log_cache_usage(agent: str, response):
+    """
+    응답의 prompt cache 사용량 출력
+    스트리밍으로 받은 청크는 response_metadata 대신 usage_metadata에 사용량이 들어있음
+    스트림이 청크 없이 끝나 response가 None이면 출력하지 않음
+    """
+    if response is None:
+        return
+    usage = response.response_metadata.get("usage") or {}
+    usage_metadata = getattr(response, "usage_metadata", None) or {}
+    details = usage_metadata.get("input_token_details") or {}
+    print(
+        f"💾 {agent} prompt cache - "
+        f"read: {usage.get('cache_read_input_tokens') or details.get('cache_read') or 0}, "
+        f"write: {usage.get('cache_creation_input_tokens') or details.get('cache_creation') or 0}, "
+        f"input: {usage.get('input_tokens') or usage_metadata.get('input_tokens') or 0}"
+    )
+
+
+def to_prompt_json(data) -> str:
+    """
+    프롬프트에 넣을 JSON 문자열 (orjson, 들여쓰기 2칸, 키 정렬)
+    키를 정렬해 같은 데이터는 항상 같은 문자열이 되므로 prompt cache prefix가 유지됨
+    """
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS).decode()
+
+
+def extract_text(response) -> str:
+    """
+    LLM 응답에서 텍스트만 추출
+    Anthropic은 tool_use가 있으면 content를 블록 리스트로 반환하므로
+    str()로 변환하지 않고 text 블록만 이어붙임
+    """
+    content = response.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "")
+        for block in content
+        if isinstance(block, dict) and block.get("type") == "text"
+    )
@@ -2,185 +2,397 @@
 Orchestrator Agent (Claude 4.5)
 전체 조율 및 최종 의사결정
 """
-from langchain_anthropic import ChatAnthropic
-from langchain_core.messages import SystemMessage, HumanMessage
-from .state import AgentState
-from tools.bash_tool import bash_tools
-import os
-
-
-# Claude 4.5 모델 초기화
-claude_orchestrator = ChatAnthropic(
-    model="claude-sonnet-4-20250514",
-    api_key=os.getenv("ANTHROPIC_API_KEY"),
-    temperature=0.7
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from .state import AgentState, get_user_request
+from .llm import HAIKU_MODEL, cached_system_message, chat_model, extract_text, llm_semaphore, log_cache_usage
+from tools.bash_tool import bash_tools, run_tool, summarize_output, tool_executor
+import asyncio
+import hashlib
+import orjson
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+
+@lru_cache(maxsize=1)
+def claude_orchestrator():
+    """
+    Sonnet 라우터: bash 도구 바인딩은 처음 한 번만 (도구 스키마 변환 재사용)
+    """
+    return chat_model().bind_tools(bash_tools, temperature=0.7)
+
+
+@lru_cache(maxsize=1)
+def claude_router():
+    """
+    1차 라우터: 소형 모델, 도구 없이 두 줄만 출력
+    """
+    return chat_model(HAIKU_MODEL).bind(temperature=0, max_tokens=50)
+
+# LLM 없이 요청 유형을 정해도 되는 고정밀 표현
+# ORCHESTRATOR_PROMPT의 키워드("사용", "분석", "배포" 등)는 정보 조회 문장에도 흔히 나오므로 여기서는 쓰지 않음
+# ("메모리 사용량은?", "로그 분석해줘", "배포 현황 어때?"는 모두 정보 조회)
+INFORMATION_PHRASES = ("비밀번호", "보여줘", "조회해줘", "찾아줘")
+DEPLOYMENT_PHRASES = (
+    "도입할까", "도입해야", "도입할지", "도입하는 게", "도입하는게", "도입 여부",
+    "설치할까", "설치해야", "설치할지", "설치 여부",
 )
 
+# Claude 라우팅 결정 캐시 (LRU)
+ROUTING_CACHE_SIZE = 256
+routing_cache = OrderedDict()
+routing_cache_lock = threading.Lock()
+
+# 라우팅 출력 파싱
+REQUEST_TYPE_RE = re.compile(r"^REQUEST_TYPE:\s*(\S+)", re.MULTILINE)
+NEXT_AGENT_RE = re.compile(r"^NEXT_AGENT:\s*(\S+)", re.MULTILINE)
+REQUEST_TYPES = ("information_query", "deployment_decision")
+AGENTS = ("planning", "research", "decision", "prompt_generator", "end")
+
+# 각 에이전트로 가기 전에 반드시 채워져 있어야 하는 상태
+AGENT_PREREQUISITES = {
+    "decision": "research_data",
+    "prompt_generator": "decision_report",
+}
+
+# 진행 상태 요약에 넣을 (state 필드, 표시 문구)
+CONTEXT_FIELDS = (
+    ("task_plan", "✅ 계획 수립 완료"),
+    ("research_data", "✅ 클러스터 분석 완료"),
+    ("implementation_prompt", "✅ 구현 프롬프트 생성 완료"),
+)
 
-ORCHESTRATOR_PROMPT = """You are the Orchestrator of a K8s Analysis & Decision System.
+# 스트리밍 중 NEXT_AGENT 라인이 완성(줄바꿈까지 수신)됐는지 확인
+NEXT_AGENT_LINE_RE = re.compile(r"^NEXT_AGENT:.*\n", re.MULTILINE)
 
-## Role
-Determine request type and route to appropriate agents.
+
+ORCHESTRATOR_PROMPT = """You are the Orchestrator of a K8s Analysis & Decision System.
+Determine the request type and route to the next agent.
 
 ## Request Types
+- information_query (정보 조회): "알려줘", "조회", "확인", "보여줘", "찾아줘", "검색", "상태", "비밀번호", "목록", "리스트"
+  e.g. "PostgreSQL 비밀번호 알려줘", "Secret 목록 보여줘"
+- deployment_decision (도입 결정): "도입", "설치", "배포", "필요", "결정", "추천", "분석", "사용"
+  e.g. "Tekton 도입할까?", "Harbor가 필요한지 분석해줘"
+
+## Routing
+Progress is given by task_plan, research_data, decision_report, implementation_prompt.
+- information_query: research → end
+- deployment_decision: planning → research → decision → prompt_generator (추천 only; 비추천 → end) → end
 
-### Type 1: Information Query (정보 조회)
-Keywords: "알려줘", "조회", "확인", "보여줘", "찾아줘", "검색", "상태", "비밀번호", "목록", "리스트"
-Examples:
-- "PostgreSQL 비밀번호 알려줘"
-- "현재 Pod 상태 확인해줘"
-- "Secret 목록 보여줘"
-Workflow: research → end
-
-### Type 2: Deployment Decision (도입 결정)
-Keywords: "도입", "설치", "배포", "필요", "결정", "추천", "분석", "사용"
-Examples:
-- "Tekton 도입할까?"
-- "Harbor가 필요한지 분석해줘"
-Workflow: planning → research → prompt_generator → end
-
-## Available Agents
-- planning: Plan deployment requirements (deployment_decision only)
-- research: Analyze cluster state or retrieve information
-- decision: Make final decision (추천/비추천) (deployment_decision only)
-- prompt_generator: Generate implementation guide for other AI (deployment_decision, only if approved)
-- end: Complete the task
-
-## Decision Logic
-
-**First, determine request_type (첫 호출 시만):**
-- If user wants information → request_type = "information_query"
-- If user wants deployment decision → request_type = "deployment_decision"
-
-**Then route based on request_type:**
-
-### For information_query:
-- Current state: start → NEXT_AGENT: research
-- Current state: research done → NEXT_AGENT: end
-
-### For deployment_decision:
-- Current state: start → NEXT_AGENT: planning
-- Current state: planning done → NEXT_AGENT: research
-- Current state: research done → NEXT_AGENT: decision
-- Current state: decision done (추천) → NEXT_AGENT: prompt_generator
-- Current state: decision done (비추천) → NEXT_AGENT: end
-- Current state: prompt_generator done → NEXT_AGENT: end
-
-Check state.get("task_plan"), state.get("research_data"), state.get("decision_report"), state.get("implementation_prompt") to determine current progress.
+## Tools
+Prefer batch_execute when you have 2 or more independent commands.
 
 ## Output Format
 REQUEST_TYPE: <information_query|deployment_decision>
-NEXT_AGENT: <agent_name>
+NEXT_AGENT: <planning|research|decision|prompt_generator|end>
 REASON: <brief reason>
+"""
+
+
+# 첫 호출과 도구 결과 후 재호출이 같은 system prefix를 공유 (prompt caching 대상)
+ORCHESTRATOR_SYSTEM = cached_system_message(ORCHESTRATOR_PROMPT)
+
+
+# 소형 모델용 축약 프롬프트 (도구 스키마 없음)
+ROUTER_PROMPT = """Route a request in a K8s analysis system.
+
+REQUEST_TYPE:
+- information_query: user wants to see/check/look up something (status, password, list, usage)
+- deployment_decision: user asks whether to deploy/install/adopt a tool
 
-Analyze user intent carefully to choose the correct request type.
+NEXT_AGENT, based on progress:
+- information_query: research (if not done) -> end
+- deployment_decision: planning -> research -> decision -> prompt_generator (only if approved) -> end
+
+Reply with exactly two lines:
+REQUEST_TYPE: <information_query|deployment_decision>
+NEXT_AGENT: <planning|research|decision|prompt_generator|end>
 """
 
+ROUTER_SYSTEM = SystemMessage(content=ROUTER_PROMPT)
+
 
-def orchestrator_node(state: AgentState) -> AgentState:
+def classify_request(user_request: str) -> Optional[str]:
     """
-    Orchestrator 노드: 전체 워크플로우 조율
+    고정밀 표현으로 요청 유형을 규칙 기반 분류
+    한쪽 표현만 포함된 경우에만 결정하고, 없거나 양쪽 모두면 None (라우터 LLM에게 맡김)
     """
-    messages = state["messages"]
-    iteration_count = state.get("iteration_count", 0)
+    is_information = any(phrase in user_request for phrase in INFORMATION_PHRASES)
+    is_deployment = any(phrase in user_request for phrase in DEPLOYMENT_PHRASES)
+    if is_information == is_deployment:
+        return None
+    return "information_query" if is_information else "deployment_decision"
 
-    # 컨텍스트 구성
-    context_parts = [f"현재 반복 횟수: {iteration_count}/2"]
 
-    if state.get("task_plan"):
-        context_parts.append(f"✅ 계획 수립 완료")
+def deployment_next_agent(state: AgentState) -> str:
+    """
+    도입 결정 워크플로우의 다음 에이전트
+    planning → research → decision → prompt_generator(추천시만) → end
+    """
+    decision_report = state.get("decision_report")
 
-    if state.get("research_data"):
-        context_parts.append(f"✅ 클러스터 분석 완료")
+    if not state.get("task_plan"):
+        return "planning"
+    if not state.get("research_data"):
+        return "research"
+    if not decision_report:
+        return "decision"
+    if decision_report.get("recommendation") == "approve" and not state.get("implementation_prompt"):
+        return "prompt_generator"
+    return "end"
 
-    if state.get("implementation_prompt"):
-        context_parts.append(f"✅ 구현 프롬프트 생성 완료")
 
-    context = "\n".join(context_parts)
+def routing_key(user_request: str, state: AgentState) -> tuple:
+    """
+    라우팅 캐시 키: 정규화한 사용자 요청 + 현재 진행 상태
+    """
+    normalized = " ".join(user_request.lower().split())
+    decision_report = state.get("decision_report") or {}
+    return (
+        hashlib.sha256(normalized.encode()).hexdigest(),
+        bool(state.get("task_plan")),
+        bool(state.get("research_data")),
+        decision_report.get("recommendation"),
+        bool(state.get("implementation_prompt")),
+    )
+
+
+def next_agent_for(request_type: str, state: AgentState) -> str:
+    """
+    요청 유형과 진행 상태로 정해지는 다음 에이전트 (상태 머신)
+    """
+    if request_type == "information_query":
+        # 정보 조회: research → end
+        return "end" if state.get("research_data") else "research"
+    return deployment_next_agent(state)
+
+
+def route_without_llm(state: AgentState, user_request: str, key: tuple) -> Optional[tuple[str, str]]:
+    """
+    Claude 없이 (request_type, next_agent)를 결정할 수 있으면 반환
+    1. 요청 유형이 이미 정해졌으면 이후 전환은 상태 머신으로 결정
+    2. 같은 요청/진행 상태에 대한 이전 Claude 결정 (캐시)
+    3. 고정밀 표현으로 분류가 확실한 경우 규칙 기반 라우팅
+    """
+    request_type = state.get("request_type")
+    if request_type in REQUEST_TYPES:
+        return request_type, next_agent_for(request_type, state)
 
-    # 사용자 요청
-    user_request = messages[-1]["content"] if messages else ""
+    with routing_cache_lock:
+        if key in routing_cache:
+            routing_cache.move_to_end(key)
+            return routing_cache[key]
 
-    # Claude에 bash 도구 바인딩
-    claude_with_tools = claude_orchestrator.bind_tools(bash_tools)
+    request_type = classify_request(user_request)
+    if request_type:
+        return request_type, next_agent_for(request_type, state)
+    return None
 
-    # Claude 호출
-    response = claude_with_tools.invoke([
-        SystemMessage(content=ORCHESTRATOR_PROMPT),
-        HumanMessage(content=f"사용자 요청: {user_request}\n\n현재 상태:\n{context}")
+
+def remember_route(key: tuple, request_type: Optional[str], next_agent: str):
+    """
+    Claude의 라우팅 결정을 캐시에 저장
+    """
+    if not request_type:
+        return
+    with routing_cache_lock:
+        routing_cache[key] = (request_type, next_agent)
+        routing_cache.move_to_end(key)
+        if len(routing_cache) > ROUTING_CACHE_SIZE:
+            routing_cache.popitem(last=False)
+
+
+def build_context(state: AgentState) -> str:
+    """
+    현재 진행 상태 요약
+    """
+    decision_report = state.get("decision_report")
+    return "\n".join([
+        f"현재 반복 횟수: {state.get('iteration_count', 0)}/2",
+        *(label for field, label in CONTEXT_FIELDS if state.get(field)),
+        *([f"✅ 의사결정 완료 ({decision_report.get('recommendation')})"] if decision_report else []),
     ])
 
+
+async def ask_router(state: AgentState, user_request: str) -> Optional[str]:
+    """
+    소형 모델로 라우팅 시도
+    출력 형식이 맞지 않거나 상태와 모순되면 None (Sonnet으로 escalate)
+    """
+    try:
+        async with llm_semaphore:
+            response = await claude_router().ainvoke([
+                ROUTER_SYSTEM,
+                HumanMessage(content=f"사용자 요청: {user_request}\n\n현재 상태:\n{build_context(state)}")
+            ])
+    except Exception as e:
+        print(f"⚠️ Router 호출 실패, Sonnet으로 escalate: {e}")
+        return None
+    content = extract_text(response)
+
+    request_type = REQUEST_TYPE_RE.search(content)
+    next_agent = NEXT_AGENT_RE.search(content)
+    if not request_type or not next_agent:
+        print("⚠️ Router: 출력 형식 불일치, Sonnet으로 escalate")
+        return None
+    if request_type.group(1) not in REQUEST_TYPES or next_agent.group(1) not in AGENTS:
+        print("⚠️ Router: 알 수 없는 값, Sonnet으로 escalate")
+        return None
+
+    prerequisite = AGENT_PREREQUISITES.get(next_agent.group(1))
+    if prerequisite and not state.get(prerequisite):
+        print(f"⚠️ Router: {next_agent.group(1)} 선행 조건({prerequisite}) 미충족, Sonnet으로 escalate")
+        return None
+
+    return content
+
+
+async def ask_claude(state: AgentState, user_request: str) -> str:
+    """
+    Claude에게 라우팅을 묻고 (필요시 도구 실행 후 재호출) 응답 텍스트 반환
+    user_request는 사용자 원래 요청 (마지막 메시지는 이전 에이전트의 긴 출력일 수 있음)
+    """
+    context = build_context(state)
+
+    # Claude 호출 (정적인 system 프롬프트를 앞에, 동적인 요청/상태는 뒤에 배치해 캐시 prefix 유지)
+    # 스트리밍으로 받으면서 NEXT_AGENT 라인이 완성되면 나머지(REASON 등) 생성을 기다리지 않고 중단
+    # 요청 메시지는 한 번만 만들어 도구 결과 재호출에서도 같은 객체를 재사용
+    # 재호출은 앞부분(도구 + system + 요청)이 같으므로 요청 끝에도 cache breakpoint를 둬서 캐시에서 읽힘
+    request_message = HumanMessage(content=[{
+        "type": "text",
+        "text": f"사용자 요청: {user_request}\n\n현재 상태:\n{context}",
+        "cache_control": {"type": "ephemeral"}
+    }])
+    stream = claude_orchestrator().astream([
+        ORCHESTRATOR_SYSTEM,
+        request_message
+    ])
+    response = None
+    streamed_text = ""
+    # (도구, 인자) → Future
+    # 같은 응답 안에서 (도구, 인자)가 동일한 호출은 한 번만 실행하고 결과 재사용
+    # 도구는 blocking subprocess 기반이므로 tool_executor 스레드에서 실행하고 event loop는 비워둠
+    loop = asyncio.get_running_loop()
+    futures = {}
+
+    def submit(tool_call: dict) -> tuple:
+        call_key = (tool_call['name'], orjson.dumps(tool_call.get('args', {}), option=orjson.OPT_SORT_KEYS))
+        if call_key not in futures:
+            futures[call_key] = loop.run_in_executor(tool_executor, run_tool, tool_call['name'], tool_call.get('args', {}))
+        return call_key
+
+    async with llm_semaphore:
+        try:
+            async for chunk in stream:
+                response = chunk if response is None else response + chunk
+                streamed_text += extract_text(chunk)
+                # 다음 도구 호출이 시작됐으면 앞의 호출은 인자가 완성된 것이므로
+                # 나머지 응답을 생성하는 동안 미리 실행 (마지막 호출은 아직 생성 중일 수 있음)
+                for tool_call in response.tool_calls[:-1]:
+                    submit(tool_call)
+                # 도구 호출이 시작됐으면 끝까지 받아야 함
+                if not response.tool_call_chunks and NEXT_AGENT_LINE_RE.search(streamed_text):
+                    print("⚡ Orchestrator: NEXT_AGENT 수신, 스트림 조기 종료")
+                    break
+        finally:
+            await stream.aclose()
+    log_cache_usage("Orchestrator", response)
+
     # Tool calls 처리
     tool_outputs = []
+    tool_context = ""
+    all_failed = True
     if hasattr(response, 'tool_calls') and response.tool_calls:
-        for tool_call in response.tool_calls:
+        # 독립적인 도구 호출은 동시에 실행 (스트리밍 중 이미 시작된 호출은 그대로 사용)
+        call_keys = [submit(tool_call) for tool_call in response.tool_calls]
+
+        results = await asyncio.gather(*(futures[call_key] for call_key in call_keys), return_exceptions=True)
+
+        # 원래 tool_calls 순서대로 결과 정리
+        tool_messages = []
+        for tool_call, tool_result in zip(response.tool_calls, results):
             tool_name = tool_call['name']
             tool_args = tool_call.get('args', {})
 
-            try:
-                # tool_name에 따라 올바른 도구 선택
-                from tools.bash_tool import execute_bash, execute_host
-                if tool_name == "execute_host":
-                    tool_func = execute_host
-                else:
-                    tool_func = execute_bash
-                tool_result = tool_func.invoke(tool_args)
+            if isinstance(tool_result, Exception):
+                tool_outputs.append(f"\n❌ **{tool_name}** failed: {str(tool_result)}")
+                tool_result = f"❌ {tool_name} failed: {str(tool_result)}"
+            else:
+                all_failed = all_failed and tool_result.startswith("❌")
                 tool_outputs.append(f"\n🔧 **Orchestrator {tool_name}({tool_args.get('command', '')[:50]}...)**:\n{tool_result}")
-            except Exception as e:
-                tool_outputs.append(f"\n❌ **{tool_name}** failed: {str(e)}")
-
-        # Tool 결과와 함께 재호출
-        if tool_outputs:
-            tool_context = "\n".join(tool_outputs)
-            response = claude_orchestrator.invoke([
-                SystemMessage(content=ORCHESTRATOR_PROMPT),
-                HumanMessage(content=f"사용자 요청: {user_request}\n\n현재 상태:\n{context}"),
-                HumanMessage(content=f"도구 실행 결과:\n{tool_context}")
-            ])
 
-    content = response.content
-    if tool_outputs:
-        content = "\n".join(tool_outputs) + "\n\n" + content
+            # 라우팅 판단에는 전체 출력이 필요 없으므로 LLM에는 요약본만 전달
+            # (전체 출력은 메시지 이력에 그대로 남음)
+            tool_summary = summarize_output(tool_result)
+            if len(tool_summary) < len(tool_result):
+                print(f"✂️ Orchestrator {tool_name} 출력 압축: {len(tool_result)} → {len(tool_summary)} chars "
+                      f"({len(tool_summary) / len(tool_result):.0%})")
+            tool_messages.append(ToolMessage(content=tool_summary, tool_call_id=tool_call['id']))
 
-    # 요청 타입 파싱
-    request_type = state.get("request_type")  # 기존 값 유지
-    if "REQUEST_TYPE:" in content and not request_type:
-        for line in content.split("\n"):
-            if line.startswith("REQUEST_TYPE:"):
-                request_type = line.split(":")[1].strip()
-                state["request_type"] = request_type
-                break
+        tool_context = "\n".join(tool_outputs)
+
+        # 도구가 전부 실패하면 새로 판단할 데이터가 없으므로 재호출 생략
+        # (NEXT_AGENT가 없으면 orchestrator_node의 기본값/보정 로직이 처리)
+        if all_failed:
+            print("⚡ Orchestrator: 도구가 모두 실패 - 재호출 생략")
+        else:
+            # Tool 결과를 ToolMessage로 이어붙여 재호출
+            async with llm_semaphore:
+                response = await claude_orchestrator().ainvoke([
+                    ORCHESTRATOR_SYSTEM,
+                    request_message,
+                    AIMessage(content=extract_text(response), tool_calls=response.tool_calls),
+                    *tool_messages
+                ])
+            log_cache_usage("Orchestrator", response)
 
-    # 다음 에이전트 파싱
-    next_agent = "planning"  # 기본값
-    if "NEXT_AGENT:" in content:
-        for line in content.split("\n"):
-            if line.startswith("NEXT_AGENT:"):
-                next_agent = line.split(":")[1].strip()
-                break
+    content = extract_text(response)
+    if tool_context:
+        content = f"{tool_context}\n\n{content}"
 
-    # request_type에 따른 라우팅 보정
-    if request_type == "information_query":
-        # 정보 조회: Planning 건너뛰기
-        if next_agent == "planning":
-            next_agent = "research"
-    elif request_type == "deployment_decision":
-        # 의사결정: 순서 보장 (planning → research → decision → prompt_generator(추천시만) → end)
-        task_plan = state.get("task_plan")
-        research_data = state.get("research_data")
-        decision_report = state.get("decision_report")
-        implementation_prompt = state.get("implementation_prompt")
-
-        if not task_plan:
-            next_agent = "planning"
-        elif not research_data:
-            next_agent = "research"
-        elif not decision_report:
-            next_agent = "decision"
-        elif decision_report and decision_report.get("recommendation") == "approve" and not implementation_prompt:
-            next_agent = "prompt_generator"
+    return content
+
+
+async def orchestrator_node(state: AgentState) -> AgentState:
+    """
+    Orchestrator 노드: 전체 워크플로우 조율
+    LangGraph가 async 노드로 실행 (mas_graph.astream/ainvoke)
+    """
+    original_request = get_user_request(state)
+    key = routing_key(original_request, state)
+
+    decided = route_without_llm(state, original_request, key)
+    if decided:
+        request_type, next_agent = decided
+        print(f"⚡ Orchestrator: 규칙 기반 라우팅 ({request_type} → {next_agent})")
+        if not state.get("request_type"):
+            state["request_type"] = request_type
+        content = f"REQUEST_TYPE: {request_type}\nNEXT_AGENT: {next_agent}\nREASON: 규칙 기반 라우팅"
+    else:
+        # 소형 모델 우선, 실패 시 Sonnet (도구 사용 가능)
+        content = await ask_router(state, original_request) or await ask_claude(state, original_request)
+
+        # 요청 타입 파싱
+        request_type = state.get("request_type")  # 기존 값 유지
+        if not request_type:
+            match = REQUEST_TYPE_RE.search(content)
+            if match and match.group(1) in REQUEST_TYPES:
+                request_type = match.group(1)
+                state["request_type"] = request_type
+
+        if request_type in REQUEST_TYPES:
+            # 요청 유형이 정해지면 다음 에이전트는 규칙/캐시 경로와 같은 상태 머신으로 결정
+            # (LLM이 research 전에 end를 고르는 등 순서를 건너뛰지 않도록)
+            next_agent = next_agent_for(request_type, state)
         else:
-            next_agent = "end"
+            # 요청 유형을 알 수 없으면 LLM이 고른 다음 에이전트 사용
+            match = NEXT_AGENT_RE.search(content)
+            next_agent = match.group(1) if match and match.group(1) in AGENTS else "planning"  # 기본값
+
+        remember_route(key, request_type, next_agent)
 
     # 메시지 추가
     state["messages"].append({
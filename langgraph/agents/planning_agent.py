@@ -2,20 +2,87 @@
 Planning Agent (Claude 4.5)
 작업 계획 수립 및 단계별 태스크 정의
 """
-from langchain_anthropic import ChatAnthropic
-from langchain_core.messages import SystemMessage, HumanMessage
-from .state import AgentState
-import os
-import json
-
-
-# Claude 4.5 모델 초기화
-claude_planning = ChatAnthropic(
-    model="claude-sonnet-4-20250514",
-    api_key=os.getenv("ANTHROPIC_API_KEY"),
-    temperature=0.3  # 계획은 더 deterministic하게
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel, Field
+from .state import AgentState, get_user_request
+from .llm import cached_system_message, chat_model, llm_semaphore, log_cache_usage
+from tools.bash_tool import cached_run_tool, summarize_output, tool_executor
+from collections import OrderedDict
+from functools import lru_cache
+import asyncio
+import copy
+import hashlib
+import threading
+import time
+from typing import Optional
+
+
+class K8sResource(BaseModel):
+    type: str = Field(description="Kubernetes resource kind, e.g. Deployment")
+    name: str
+
+
+class FolderStructure(BaseModel):
+    base_path: str = Field(description="e.g. deploy/X")
+    directories: list[str] = Field(description='e.g. ["base", "overlays/prod"]')
+
+
+class EstimatedResources(BaseModel):
+    cpu: str = Field(default="", description='CPU cores, e.g. "2"')
+    memory: str = Field(default="", description='e.g. "4Gi"')
+    storage: str = Field(default="", description='e.g. "20Gi"')
+
+
+class Requirements(BaseModel):
+    min_k8s_version: str = Field(default="", description='e.g. "1.24"')
+    estimated_resources: EstimatedResources = Field(default_factory=EstimatedResources)
+    dependencies: list[str] = Field(default_factory=list)
+
+
+class TaskPlan(BaseModel):
+    """High-level plan for deploying a tool to the Kubernetes cluster."""
+    task_type: str = "k8s_infrastructure"
+    summary: str = Field(description="e.g. Deploy X to Kubernetes cluster")
+    target_tool: str = Field(description="Name of the tool/service to deploy")
+    folder_structure: FolderStructure
+    k8s_resources: list[K8sResource]
+    research_needed: list[str] = Field(
+        description="Cluster information to gather, e.g. Check Kubernetes version, Check storage classes"
+    )
+    requirements: Requirements
+
+
+@lru_cache(maxsize=1)
+def claude_planning():
+    """
+    공유 Claude 클라이언트에 TaskPlan 도구를 강제로 바인딩 (structured output)
+    같은 요청이면 같은 계획이 나오도록 temperature 0 (계획 캐시와 일관성 유지)
+    """
+    return chat_model().bind_tools([TaskPlan], tool_choice="TaskPlan", temperature=0)
+
+# 계획 캐시 (LRU + TTL): 같은 요청을 다시 받으면 Claude 호출 생략
+PLAN_CACHE_SIZE = 512
+PLAN_CACHE_TTL = 3600  # 초
+plan_cache = OrderedDict()
+plan_cache_lock = threading.Lock()
+
+# 진행 중인 계획 (키 → [Future, 기다리는 세션 수])
+# 여러 세션이 같은 요청을 동시에 보내면 Claude 호출 한 번을 공유
+plan_inflight = {}
+
+
+# 계획과 무관하게 Research가 거의 항상 확인하는 기본 클러스터 정보
+# Planning LLM 호출과 동시에 미리 실행 (speculative probe)
+PROBE_COMMANDS = (
+    "kubectl version",
+    "kubectl get nodes -o wide",
+    "kubectl get ns",
+    "kubectl get storageclass",
 )
 
+# probe 결과 캐시 유효 시간 (초): Research가 같은 명령어를 요청하면 캐시에서 바로 반환
+PROBE_CACHE_TTL = 60
+
 
 PLANNING_PROMPT = """You are the K8s Infrastructure Planning Agent.
 
@@ -29,65 +96,69 @@ When a user wants to deploy something (e.g., "Tekton", "Harbor", "Prometheus"):
 3. Identify what K8s resources would be needed
 4. Determine what cluster information to gather
 
-## Output Format (JSON)
-```json
-{
-  "task_type": "k8s_infrastructure",
-  "summary": "Deploy X to Kubernetes cluster",
-  "target_tool": "Name of the tool/service to deploy",
-  "folder_structure": {
-    "base_path": "deploy/X",
-    "directories": ["base", "overlays/prod"]
-  },
-  "k8s_resources": [
-    {"type": "Namespace", "name": "X"},
-    {"type": "Deployment", "name": "X"},
-    {"type": "Service", "name": "X-svc"}
-  ],
-  "research_needed": [
-    "Check Kubernetes version",
-    "Check existing similar tools",
-    "Verify available resources",
-    "Check storage classes"
-  ],
-  "requirements": {
-    "min_k8s_version": "1.24",
-    "estimated_resources": {"cpu": "2", "memory": "4Gi"},
-    "dependencies": ["tool1", "tool2"]
-  }
-}
-```
+## Output
+Return the plan by calling the TaskPlan tool.
 
 Keep it simple and high-level. Focus on what needs to be checked, not detailed YAML structures.
 """
 
 
-def planning_node(state: AgentState) -> AgentState:
+# 계획 수립 규칙 (prompt caching 대상)
+# 프롬프트가 모델의 최소 캐시 길이보다 짧으면 Anthropic이 cache_control을 무시하므로 부작용 없음
+PLANNING_SYSTEM = cached_system_message(PLANNING_PROMPT)
+
+
+def plan_cache_key(user_request: str) -> str:
     """
-    Planning 노드: 작업 계획 수립
+    계획 캐시 키: 프롬프트 + 정규화한 사용자 요청
+    (프롬프트가 바뀌면 이전 계획은 자동으로 무효화)
     """
-    messages = state["messages"]
-    user_request = messages[0]["content"] if messages else ""
+    normalized = " ".join(user_request.lower().split())
+    return hashlib.sha256(f"{PLANNING_PROMPT}\0{normalized}".encode()).hexdigest()
 
-    # Claude 호출
-    response = claude_planning.invoke([
-        SystemMessage(content=PLANNING_PROMPT),
-        HumanMessage(content=f"사용자 요청: {user_request}")
-    ])
 
-    content = response.content
+def cached_plan(key: str) -> Optional[tuple[dict, str]]:
+    """
+    만료되지 않은 캐시 계획 반환 (state에서 수정될 수 있으므로 복사본)
+    """
+    with plan_cache_lock:
+        entry = plan_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, task_plan, content = entry
+        if expires_at < time.monotonic():
+            del plan_cache[key]
+            return None
+        plan_cache.move_to_end(key)
+    return copy.deepcopy(task_plan), content
 
-    # JSON 파싱 시도
-    try:
-        # JSON 블록 추출
-        if "```json" in content:
-            json_str = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            json_str = content.split("```")[1].split("```")[0].strip()
-        else:
-            json_str = content
 
-        task_plan = json.loads(json_str)
+def remember_plan(key: str, task_plan: dict, content: str):
+    """
+    파싱에 성공한 계획을 캐시에 저장
+    """
+    with plan_cache_lock:
+        plan_cache[key] = (time.monotonic() + PLAN_CACHE_TTL, copy.deepcopy(task_plan), content)
+        plan_cache.move_to_end(key)
+        if len(plan_cache) > PLAN_CACHE_SIZE:
+            plan_cache.popitem(last=False)
+
+
+async def create_plan(user_request: str) -> tuple[dict, str]:
+    """
+    Claude로 계획을 만들고 (task_plan, 사용자용 요약) 반환
+    """
+    # Claude 호출: TaskPlan 도구 호출을 강제해 스키마에 맞는 JSON만 받음
+    # (코드 블록/설명 문장 파싱 불필요)
+    async with llm_semaphore:
+        response = await claude_planning().ainvoke([
+            PLANNING_SYSTEM,
+            HumanMessage(content=f"사용자 요청: {user_request}")
+        ])
+    log_cache_usage("Planning", response)
+
+    try:
+        task_plan = TaskPlan.model_validate(response.tool_calls[0]["args"]).model_dump()
 
         # 사용자 친화적인 한국어 요약 생성
         summary_parts = []
@@ -132,6 +203,7 @@ def planning_node(state: AgentState) -> AgentState:
                 summary_parts.append(f"- {item_ko}")
 
         user_friendly_content = "\n".join(summary_parts)
+        remember_plan(plan_cache_key(user_request), task_plan, user_friendly_content)
 
     except Exception as e:
         task_plan = {
@@ -142,8 +214,89 @@ def planning_node(state: AgentState) -> AgentState:
         }
         user_friendly_content = "📋 요구사항 분석 중...\n\n기본 정보를 확인하겠습니다."
 
+    return task_plan, user_friendly_content
+
+
+async def shared_plan(key: str, user_request: str) -> tuple[dict, str]:
+    """
+    같은 키의 계획이 이미 진행 중이면 그 결과를 기다려 공유하고, 아니면 직접 생성
+    직접 생성하던 세션이 취소되면 기다리던 세션이 다시 계획을 세움
+    """
+    while True:
+        with plan_cache_lock:
+            entry = plan_inflight.get(key)
+            if entry is None:
+                entry = plan_inflight[key] = [asyncio.get_running_loop().create_future(), 0]
+                break
+            entry[1] += 1
+
+        print("⚡ Planning: 진행 중인 동일 요청의 계획 공유")
+        try:
+            # 기다리던 세션이 취소돼도 공유 Future(다른 세션의 결과)는 취소되지 않음
+            result = await asyncio.shield(entry[0])
+        finally:
+            with plan_cache_lock:
+                entry[1] -= 1
+        if result is not None:
+            task_plan, content = result
+            return copy.deepcopy(task_plan), content
+        # None: 생성하던 세션이 취소됨 → 진행 중 항목이 지워졌으므로 다시 시도
+
+    future = entry[0]
+    try:
+        result = await create_plan(user_request)
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        # 다른 세션까지 취소하지 않고 다시 계획하도록 알림
+        future.set_result(None)
+        raise
+    except Exception as e:
+        with plan_cache_lock:
+            waiting = entry[1]
+        if waiting:
+            future.set_exception(e)
+        else:
+            # 기다리는 세션이 없으면 예외를 넣지 않음 ("Future exception was never retrieved" 방지)
+            future.cancel()
+        raise
+    finally:
+        with plan_cache_lock:
+            del plan_inflight[key]
+
+
+async def planning_node(state: AgentState) -> AgentState:
+    """
+    Planning 노드: 작업 계획 수립
+    계획을 세우는 동안 기본 클러스터 정보(probe)를 함께 수집
+    """
+    user_request = get_user_request(state)
+
+    # 클러스터 probe를 먼저 띄워두고 그동안 계획 수립
+    loop = asyncio.get_running_loop()
+    probe_futures = [
+        loop.run_in_executor(tool_executor, cached_run_tool, "execute_host", {"command": command, "use_sudo": True}, PROBE_CACHE_TTL)
+        for command in PROBE_COMMANDS
+    ]
+
+    key = plan_cache_key(user_request)
+    cached = cached_plan(key)
+    if cached:
+        print("⚡ Planning: 캐시된 계획 사용")
+        task_plan, user_friendly_content = cached
+    else:
+        task_plan, user_friendly_content = await shared_plan(key, user_request)
+
+    probe_results = []
+    for command, result in zip(PROBE_COMMANDS, await asyncio.gather(*probe_futures, return_exceptions=True)):
+        if isinstance(result, Exception):
+            probe_results.append(f"Command: {command}\nResult: ❌ Error: {str(result)}")
+        else:
+            probe_results.append(f"Command: {command}\nResult: {summarize_output(result)}")
+
     # 상태 업데이트
     state["task_plan"] = task_plan
+    state["cluster_probe"] = "\n\n".join(probe_results)
     state["messages"].append({
         "role": "planning",
         "content": user_friendly_content
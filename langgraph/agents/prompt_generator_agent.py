@@ -2,77 +2,47 @@
 Prompt Generator Agent (Claude 4.5)
 Decision Agent의 추천 결과를 바탕으로 다른 AI에게 전달할 구현 프롬프트 생성
 """
-from langchain_anthropic import ChatAnthropic
-from langchain_core.messages import SystemMessage, HumanMessage
-from .state import AgentState
-import os
-import json
+from langchain_core.messages import HumanMessage
+from langchain_core.prompts import PromptTemplate
+from .state import AgentState, get_user_request
+from .llm import bound_model, cached_system_message, extract_text, llm_semaphore, log_cache_usage, to_prompt_json
 
 
-# Claude 4.5 모델 초기화
-claude_prompt_gen = ChatAnthropic(
-    model="claude-sonnet-4-20250514",
-    api_key=os.getenv("ANTHROPIC_API_KEY"),
-    temperature=0.3
-)
+# 가이드는 기존 프로젝트 패턴을 따르도록 낮은 temperature 사용
+PROMPT_GEN_TEMPERATURE = 0.3
 
 
 PROMPT_GEN_SYSTEM = """You are the Implementation Prompt Generator.
+Write concise deployment guides for other AI assistants, following existing project patterns.
 
-## Role
-Generate structured deployment prompts for other AI assistants based on existing project patterns.
+## Environment
+- Projects root `/home/ubuntu/Projects/`, local ↔ server git sync
+- Every app: ArgoCD Application + Kustomization; secrets via Vault ExternalSecrets
 
-## Environment Context
-- **Projects Root**: `/home/ubuntu/Projects/`
-- **Git Sync**: Local ↔️ Server auto-sync
-- **ArgoCD**: All apps managed by ArgoCD
-- **Vault**: Secrets managed by Vault ExternalSecrets
-- **Kustomize**: All resources use Kustomization
+## Categories
+- `applications/`: user-facing apps, dev tools (gitea, code-server, kubernetes-dashboard, homer, umami)
+- `cluster-infrastructure/`: cluster-level tools (cert-manager, ingress-nginx, vault, external-secrets, reloader)
+- `monitoring/`: observability (prometheus, grafana, loki)
+- `databases/`: postgresql, redis, mongodb
+- `{project-name}/`: standalone projects (mas, jaejadle, joossam, portfolio)
 
-## Project Structure Categories
-
-### 1. Applications (`/home/ubuntu/Projects/applications/`)
-**용도**: User-facing applications, development tools
-**예시**: gitea, code-server, kubernetes-dashboard, homer, umami
-**패턴**:
+Category layout:
 ```
-applications/{app-name}/
+{category}/{app-name}/
 ├── argocd/{app-name}.yaml       # ArgoCD Application
-├── helm-values/{app-name}.yaml  # (Optional) Helm values
-├── vault/*.yaml                 # (Optional) ExternalSecrets
-└── kustomization.yaml           # Resource list
+├── helm-values/{app-name}.yaml  # optional
+├── vault/*.yaml                 # optional ExternalSecrets
+└── kustomization.yaml
 ```
-
-### 2. Cluster Infrastructure (`/home/ubuntu/Projects/cluster-infrastructure/`)
-**용도**: Cluster-level infrastructure tools
-**예시**: cert-manager, ingress-nginx, vault, external-secrets, reloader
-**패턴**: Same as applications
-
-### 3. Monitoring (`/home/ubuntu/Projects/monitoring/`)
-**용도**: Monitoring and observability tools
-**예시**: prometheus, grafana, loki
-
-### 4. Databases (`/home/ubuntu/Projects/databases/`)
-**용도**: Database services
-**예시**: postgresql, redis, mongodb
-
-### 5. Individual Projects (`/home/ubuntu/Projects/{project-name}/`)
-**용도**: Standalone application projects
-**예시**: mas, jaejadle, joossam, portfolio
-**패턴**:
+Standalone project layout:
 ```
 {project-name}/
-├── deploy/
-│   ├── argocd/{project-name}.yaml
-│   └── k8s/
-│       ├── base/
-│       └── overlays/prod/
+├── deploy/argocd/{project-name}.yaml
+├── deploy/k8s/base/, deploy/k8s/overlays/prod/
 └── services/
 ```
 
-## Output Format (Markdown)
-Create a CONCISE guide (MAX 25 lines total):
-
+## Output (Markdown, MAX 25 lines)
 ```markdown
 # [도구명] 배포 가이드
 
@@ -82,12 +52,7 @@ Create a CONCISE guide (MAX 25 lines total):
 **참고**: [category]/[example]/ 구조 동일
 
 ## 📂 구조
-\`\`\`
-[category]/[tool-name]/
-├── argocd/[tool-name].yaml
-├── kustomization.yaml
-└── vault/*.yaml (선택)
-\`\`\`
+(폴더 트리)
 
 ## 📋 파일
 - **argocd/**: ArgoCD Application (repoURL, path, namespace)
@@ -98,48 +63,16 @@ Create a CONCISE guide (MAX 25 lines total):
 - ArgoCD 통합
 - `/home/ubuntu/Projects/[category]/kustomization.yaml` 업데이트
 ```
-
-CRITICAL: Response MUST be under 25 lines!
-
-## Guidelines
-1. **폴더 구조와 파일 역할**만 명시 (세부 YAML은 AI가 생성)
-2. **카테고리 선택 기준** 명확히 제시
-3. **기존 프로젝트 패턴** 반드시 준수
-4. **ArgoCD, Vault, Kustomize 통합** 필수
-5. **참고 예시** 제공하여 AI가 따라할 수 있도록
+Folder structure and file roles only; no detailed YAML.
 """
 
+# 가이드 작성 규칙 (prompt caching 대상)
+PROMPT_GEN_SYSTEM_MESSAGE = cached_system_message(PROMPT_GEN_SYSTEM)
 
-def prompt_generator_node(state: AgentState) -> AgentState:
-    """
-    Prompt Generator 노드: 다른 AI에게 전달할 구현 프롬프트 생성
-    """
-    messages = state["messages"]
-    task_plan = state.get("task_plan", {})
-    research_data = state.get("research_data", {})
-    decision_report = state.get("decision_report", {})
-
-    # 입력 데이터 준비
-    plan_summary = json.dumps(task_plan, indent=2, ensure_ascii=False) if task_plan else "No plan"
-    research_summary = json.dumps(research_data, indent=2, ensure_ascii=False) if research_data else "No research"
 
-    # 사용자 원래 요청
-    user_request = messages[0]["content"] if messages else "Deploy infrastructure"
-    tool_name = task_plan.get("target_tool", "Unknown") if task_plan else "Unknown"
-
-    print(f"\n{'='*80}")
-    print(f"Prompt Generator - Creating implementation guide")
-    print(f"{'='*80}")
-
-    # Claude 호출
-    response = claude_prompt_gen.invoke([
-        SystemMessage(content=PROMPT_GEN_SYSTEM),
-        HumanMessage(content=f"""다른 AI에게 전달할 구현 가이드를 생성해주세요:
-
-**사용자 요청:** {user_request}
-**배포 대상:** {tool_name}
-
-**계획 데이터:**
+# HumanMessage 템플릿 (모듈 로드 시 한 번만 컴파일, 호출마다 값만 채움)
+# content 블록의 cache_control을 유지해야 하므로 ChatPromptTemplate 대신 블록별 PromptTemplate 사용
+DATA_TEMPLATE = PromptTemplate.from_template("""**계획 데이터:**
 ```json
 {plan_summary}
 ```
@@ -147,7 +80,12 @@ def prompt_generator_node(state: AgentState) -> AgentState:
 **클러스터 상태:**
 ```json
 {research_summary}
-```
+```""")
+
+INSTRUCTION_TEMPLATE = PromptTemplate.from_template("""다른 AI에게 전달할 구현 가이드를 생성해주세요:
+
+**사용자 요청:** {user_request}
+**배포 대상:** {tool_name}
 
 위 정보를 바탕으로:
 1. **적절한 카테고리 선택** (applications, cluster-infrastructure, monitoring, databases)
@@ -161,9 +99,110 @@ def prompt_generator_node(state: AgentState) -> AgentState:
 - 다른 AI가 이 가이드를 보고 YAML을 직접 생성할 수 있도록 간결하게 작성
 - 응답은 간결하게 유지 (너무 길면 잘립니다)
 """)
-    ])
 
-    content = response.content
+# 이미 배포되어 있거나 비추천인 경우 LLM 없이 바로 반환하는 안내 (PROMPT_GEN_SYSTEM 출력 형식과 동일한 톤)
+ALREADY_DEPLOYED_TEMPLATE = PromptTemplate.from_template("""# {tool_name} 배포 가이드
+
+## ✅ 이미 배포됨
+클러스터에 **{tool_name}**이(가) 이미 설치되어 있어 새 구현 가이드를 생성하지 않았습니다.
+**기존 도구**: {existing_tools}
+
+## 📌 다음 단계
+- 기존 `/home/ubuntu/Projects/` 아래 {tool_name} 매니페스트와 ArgoCD Application을 확인하세요
+- 버전 업그레이드나 설정 변경이 필요하면 요청을 구체적으로 다시 보내주세요
+""")
+
+NOT_RECOMMENDED_TEMPLATE = PromptTemplate.from_template("""# {tool_name} 배포 가이드
+
+## ❌ 도입 비추천
+Decision Agent가 **{tool_name}** 도입을 추천하지 않아 구현 가이드를 생성하지 않았습니다.
+자세한 이유와 대안은 위 분석 결과를 참고하세요.
+""")
+
+
+def existing_deployment(research_data: dict, tool_name: str) -> list[str]:
+    """
+    Research 결과의 기존 도구 목록에 배포 대상이 있으면 그 목록 반환 (없으면 빈 리스트)
+    목록 항목은 문자열 이름으로 정규화 ({"name": ...} 형태도 허용)
+    """
+    target = tool_name.lower().strip()
+    if not target or target == "unknown":
+        return []
+    cluster_info = research_data.get("cluster_info")
+    if not isinstance(cluster_info, dict) or not isinstance(cluster_info.get("existing_tools"), list):
+        return []
+
+    existing_tools = []
+    for tool in cluster_info["existing_tools"]:
+        name = tool.get("name") if isinstance(tool, dict) else tool
+        if name:
+            existing_tools.append(str(name).strip())
+    if any(tool.lower() == target for tool in existing_tools):
+        return existing_tools
+    return []
+
+
+async def generate_guide(plan_summary: str, research_summary: str, user_request: str, tool_name: str) -> str:
+    """
+    Claude로 구현 가이드 생성
+    """
+    # Claude 호출 (스트리밍: UI가 stream_mode="messages"로 토큰을 바로 표시)
+    prompt_messages = [
+        PROMPT_GEN_SYSTEM_MESSAGE,
+        # 계획/클러스터 데이터 블록을 앞에 두고 두 번째 cache breakpoint 지정
+        # (같은 데이터로 재시도하면 system + 데이터까지 캐시에서 읽힘)
+        HumanMessage(content=[
+            {
+                "type": "text",
+                "text": DATA_TEMPLATE.format(plan_summary=plan_summary, research_summary=research_summary),
+                "cache_control": {"type": "ephemeral"}
+            },
+            {
+                "type": "text",
+                "text": INSTRUCTION_TEMPLATE.format(user_request=user_request, tool_name=tool_name)
+            }
+        ])
+    ]
+    response = None
+    async with llm_semaphore:
+        async for chunk in bound_model(PROMPT_GEN_TEMPERATURE).astream(prompt_messages):
+            response = chunk if response is None else response + chunk
+
+    log_cache_usage("Prompt Generator", response)
+    return extract_text(response)
+
+
+async def prompt_generator_node(state: AgentState) -> AgentState:
+    """
+    Prompt Generator 노드: 다른 AI에게 전달할 구현 프롬프트 생성
+    이미 배포된 도구이거나 비추천이면 Claude 없이 템플릿으로 응답
+    """
+    task_plan = state.get("task_plan", {})
+    research_data = state.get("research_data", {})
+    decision_report = state.get("decision_report", {})
+
+    # 입력 데이터 준비 (키 정렬로 직렬화 결과를 고정해 prompt cache prefix가 매번 같도록)
+    plan_summary = to_prompt_json(task_plan) if task_plan else "No plan"
+    research_summary = to_prompt_json(research_data) if research_data else "No research"
+
+    # 사용자 원래 요청
+    user_request = get_user_request(state) or "Deploy infrastructure"
+    tool_name = task_plan.get("target_tool", "Unknown") if task_plan else "Unknown"
+
+    print(f"\n{'='*80}")
+    print(f"Prompt Generator - Creating implementation guide")
+    print(f"{'='*80}")
+
+    # 규칙 기반 short-circuit: 이미 배포되어 있거나 비추천이면 Claude 호출 없이 템플릿으로 응답
+    existing_tools = existing_deployment(research_data or {}, tool_name)
+    if existing_tools:
+        print(f"⚡ {tool_name} already deployed - skipping LLM")
+        content = ALREADY_DEPLOYED_TEMPLATE.format(tool_name=tool_name, existing_tools=", ".join(existing_tools))
+    elif decision_report and decision_report.get("recommendation") != "approve":
+        print(f"⚡ Decision is {decision_report.get('recommendation')} - skipping LLM")
+        content = NOT_RECOMMENDED_TEMPLATE.format(tool_name=tool_name)
+    else:
+        content = await generate_guide(plan_summary, research_summary, user_request, tool_name)
 
     print(f"✅ Implementation guide generated ({len(content)} characters)")
 
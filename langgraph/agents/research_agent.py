@@ -3,21 +3,19 @@ Research Agent (Claude)
 정보 수집 및 문서/코드베이스 검색
 JSON 기반 명령어 생성 방식으로 재작성
 """
-from langchain_anthropic import ChatAnthropic
-from langchain_core.messages import SystemMessage, HumanMessage
-from .state import AgentState
-import os
+from langchain_core.messages import AIMessage, HumanMessage
+from .state import AgentState, get_user_request
+from .llm import bound_model, cached_system_message, extract_text, llm_semaphore, log_cache_usage
+from tools.bash_tool import cached_run_tool, tool_executor
+from collections import deque
+from functools import lru_cache
+import asyncio
+import copy
 import json
+import orjson
 import re
-
-
-# Claude 4.5 모델 초기화
-claude_research = ChatAnthropic(
-    model="claude-sonnet-4-20250514",
-    api_key=os.getenv("ANTHROPIC_API_KEY"),
-    temperature=0.3
-)
-
+import shlex
+from typing import Optional
 
 
 RESEARCH_PROMPT = """Research Agent: Analyze cluster or retrieve information.
@@ -71,21 +69,301 @@ Choose the appropriate format based on the user's request.
 """
 
 
-def research_node(state: AgentState) -> AgentState:
+# 응답 속 JSON 객체 추출용 (뒤에 텍스트가 남아 있어도 한 번에 파싱)
+json_decoder = json.JSONDecoder()
+
+# 하나로 합칠 수 있는 kubectl get (파이프/리다이렉트/명령어 연결 없음)
+KUBECTL_GET_RE = re.compile(r"^\s*kubectl\s+get\s[^;&|<>`$]*$")
+# 값을 받는 kubectl get 옵션 (그 다음 인자는 리소스 이름이 아님)
+KUBECTL_VALUE_FLAGS = {"-n", "--namespace", "-l", "--selector", "-o", "--output", "--field-selector", "--sort-by"}
+
+# 배포 분석 후속 응답을 JSON 객체로 강제하는 assistant prefill
+JSON_PREFILL = "{"
+
+# 배포 분석에서 이만큼(문자 수) 출력을 모으면 추가 명령어 없이 최종 리포트만 요청
+ENOUGH_OUTPUT_CHARS = 4096
+
+# 최종 리포트/해석에 넣는 최근 반복 결과 수 (그 이전 결과는 버림)
+MAX_TOOL_OUTPUTS = 10
+
+# 이보다 짧은 단일 명령어 출력은 Claude 해석 없이 그대로 답변으로 사용
+TRIVIAL_OUTPUT_CHARS = 200
+
+# 명령어 선택과 결과 요약은 일관되게
+RESEARCH_TEMPERATURE = 0.3
+
+# 명령어 결과 캐시 유효 시간 (초)
+# 정보 조회는 최신 값이 중요하므로 짧게, 배포 분석은 한 번의 분석 동안 재사용
+INFORMATION_CACHE_TTL = 5
+DEPLOYMENT_CACHE_TTL = 60
+
+# 모드 설명과 리포트 형식 (prompt caching 대상, 반복마다 같은 prefix)
+RESEARCH_SYSTEM = cached_system_message(RESEARCH_PROMPT)
+
+
+def parse_command_spec(cmd_spec) -> Optional[tuple[str, dict]]:
+    """
+    Claude가 준 명령어 항목을 검증해 (tool_name, tool_args)로 변환
+    형식이 잘못된 항목은 실행 전에 걸러냄 (None 반환)
+    """
+    if not isinstance(cmd_spec, dict):
+        return None
+    command = cmd_spec.get("command")
+    if not isinstance(command, str) or not command.strip():
+        return None
+
+    tool_name = cmd_spec.get("tool", "execute_bash")
+    if tool_name == "execute_host":
+        return tool_name, {"command": command, "use_sudo": cmd_spec.get("use_sudo") is True}
+    return "execute_bash", {"command": command}
+
+
+@lru_cache(maxsize=64)
+def extract_json(text: str) -> Optional[dict]:
+    """
+    응답에서 첫 JSON 객체를 찾아 파싱 (정규식 없이 raw_decode로 한 번에)
+    ```json 블록이 있으면 그 안에서부터, 없으면 본문 처음부터 찾고
+    중첩된 중괄호도 그대로 처리함
+    같은 텍스트는 다시 파싱하지 않음 (완성된 응답만 넘길 것, 스트리밍 중 텍스트는 ReplyScanner로 확인)
+    반환값은 캐시와 공유되므로 수정하지 말고 복사해서 사용
+    """
+    fence = text.find("```json")
+    start = text.find("{", fence if fence >= 0 else 0)
+    if start < 0:
+        return None
+
+    # 빠른 경로: 닫는 펜스까지가 JSON 하나면 orjson으로 바로 파싱
+    # (kubectl 출력이 들어간 긴 리포트도 stdlib json보다 빠름)
+    if fence >= 0:
+        end = text.find("```", start)
+        try:
+            data = orjson.loads(text[start:end] if end >= 0 else text[start:])
+            if isinstance(data, dict):
+                return data
+        except orjson.JSONDecodeError:
+            pass
+
+    while start >= 0:
+        try:
+            data, _ = json_decoder.raw_decode(text, start)
+            if isinstance(data, dict):
+                return data
+        except ValueError:
+            pass
+        start = text.find("{", start + 1)
+    return None
+
+
+def trivial_answer(results_text: str) -> Optional[str]:
+    """
+    한 반복의 결과에서 명령어 하나가 성공했고 출력이 짧으면 (TRIVIAL_OUTPUT_CHARS 미만, 3줄 미만) 그 출력 반환
+    """
+    if results_text.count("Command: ") != 1:
+        return None
+    _, sep, result = results_text.partition("\nResult: ")
+    if not sep or not result.startswith("✅"):
+        return None
+    output = result.partition("\n")[2].strip()
+    if output and len(output) < TRIVIAL_OUTPUT_CHARS and output.count("\n") < 3:
+        return output
+    return None
+
+
+def is_reply_object(text: str) -> bool:
+    """
+    완성된 JSON 객체 텍스트가 명령어 요청이나 최종 리포트인지 확인
+    """
+    try:
+        data = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return False
+    return isinstance(data, dict) and ("commands" in data or ("summary" in data and "findings" in data))
+
+
+class ReplyScanner:
+    """
+    스트리밍 응답에서 명령어 요청/최종 리포트 JSON 객체가 닫혔는지 증분으로 확인
+    청크마다 새로 받은 부분만 검사하며 중괄호 깊이와 문자열 상태를 유지하고,
+    최상위 객체가 닫힐 때만 한 번 파싱함 (누적 텍스트 전체를 다시 파싱하지 않음)
+    """
+
+    def __init__(self, text: str = ""):
+        self.text = ""
+        self.start = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.feed(text)
+
+    def feed(self, chunk: str) -> bool:
+        """
+        청크를 이어 붙이고, 명령어 요청이나 최종 리포트 객체가 완성됐으면 True
+        """
+        offset = len(self.text)
+        self.text += chunk
+        for i, char in enumerate(chunk, offset):
+            if self.depth == 0:
+                if char == "{":
+                    self.start, self.depth = i, 1
+            elif self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0 and is_reply_object(self.text[self.start:i + 1]):
+                    return True
+        return False
+
+
+def merge_kubectl_gets(specs: list[tuple[str, dict]]) -> list[tuple[str, dict]]:
+    """
+    같은 옵션의 kubectl get 명령어가 여러 개면 `kubectl get R1,R2 ...` 하나로 합침
+    (프로세스 실행과 apiserver 왕복을 한 번으로 줄임, 출력은 리소스별 표가 이어서 나옴)
+    이름 지정 조회나 파이프 등 합칠 수 없는 형태가 하나라도 있으면 그대로 반환
+    """
+    if len(specs) < 2:
+        return specs
+
+    resources = []
+    common = None
+    for tool_name, tool_args in specs:
+        if tool_name != "execute_host" or not tool_args.get("use_sudo") or not KUBECTL_GET_RE.match(tool_args["command"]):
+            return specs
+        try:
+            tokens = shlex.split(tool_args["command"])
+        except ValueError:
+            # 따옴표가 맞지 않는 명령어: 합치지 않고 그대로 실행 (오류는 명령어 결과로 전달)
+            return specs
+        if len(tokens) < 3 or tokens[2].startswith("-") or "/" in tokens[2]:
+            return specs
+        options = tokens[3:]
+        # 옵션 값이 아닌 인자(리소스 이름)가 있으면 합치지 않음
+        for i, token in enumerate(options):
+            if not token.startswith("-") and (i == 0 or options[i - 1] not in KUBECTL_VALUE_FLAGS):
+                return specs
+        if common is None:
+            common = options
+        elif options != common:
+            return specs
+        resources.extend(r for r in tokens[2].split(",") if r not in resources)
+
+    command = " ".join(["kubectl", "get", ",".join(resources), *map(shlex.quote, common)])
+    print(f"⚡ Merged {len(specs)} kubectl get commands: {command[:80]}")
+    return [("execute_host", {"command": command, "use_sudo": True})]
+
+
+def command_key(tool_name: str, tool_args: dict) -> tuple:
+    """
+    중복 명령어 판별용 키 (도구, 명령어, sudo 여부)
+    """
+    return tool_name, tool_args["command"].strip(), tool_args.get("use_sudo") is True
+
+
+def attach_cluster_probe(state: AgentState):
+    """
+    Planning과 동시에 수집한 기본 클러스터 정보를 research_data의 findings 앞에 추가
+    Research는 이 명령어들을 다시 실행하지 않으므로 Decision/Prompt Generator가 볼 수 있게 함
+    """
+    probe = state.get("cluster_probe")
+    research_data = state.get("research_data")
+    if not probe or not isinstance(research_data, dict):
+        return
+    findings = research_data.get("findings")
+    if not isinstance(findings, list):
+        findings = []
+    research_data["findings"] = [{"category": "기본 클러스터 정보", "data": probe}, *findings]
+
+
+def run_command(tool_name: str, tool_args: dict, cache_ttl: float) -> str:
+    """
+    명령어 하나 실행 후 "Command: ...\nResult: ..." 형식으로 반환 (tool_executor 워커에서 실행)
+    읽기 전용 kubectl 조회는 cache_ttl초 동안 이전 결과 재사용
+    """
+    command = tool_args["command"]
+    print(f"\n🔧 Executing: {tool_name}('{command[:80]}...')")
+
+    try:
+        result = cached_run_tool(tool_name, tool_args, cache_ttl)
+        print(f"✅ Success")
+    except Exception as e:
+        result = f"❌ Error: {str(e)}"
+        print(result)
+    return f"Command: {command}\nResult: {result}"
+
+
+def command_failed(command_result: str) -> bool:
+    """
+    run_command 결과("Command: ...\nResult: ...")가 실패인지 확인
+    """
+    return command_result.partition("\nResult: ")[2].startswith("❌")
+
+
+async def execute_specs(specs: list[tuple[str, dict]], executed_commands: dict, cache_ttl: float) -> list[str]:
+    """
+    명령어들을 동시에 실행하고 요청 순서대로 결과 반환
+    같은 목록 안의 중복과 executed_commands에 이미 있는 명령어는 다시 실행하지 않음
+    """
+    keys = []
+    pending = {}
+    for tool_name, tool_args in specs:
+        key = command_key(tool_name, tool_args)
+        if key in keys:
+            continue
+        keys.append(key)
+        if key not in executed_commands:
+            pending[key] = (tool_name, tool_args)
+    if len(pending) < len(specs):
+        print(f"⚡ 중복 명령어 {len(specs) - len(pending)}개 재사용")
+
+    loop = asyncio.get_running_loop()
+    pending_results = await asyncio.gather(*(
+        loop.run_in_executor(tool_executor, run_command, tool_name, tool_args, cache_ttl)
+        for tool_name, tool_args in pending.values()
+    ))
+    executed_commands.update(zip(pending, pending_results))
+    return [executed_commands[key] for key in keys]
+
+
+async def request_final_report(conversation_prefix: tuple, outputs_text: str) -> Optional[dict]:
+    """
+    수집된 결과로 추가 명령어 없이 최종 리포트 JSON만 요청 (prefill로 JSON 응답 강제)
+    형식이 맞지 않으면 None 반환
+    """
+    conversation = [
+        *conversation_prefix,
+        HumanMessage(content=f"명령어 실행 결과:\n\n{outputs_text}\n\n충분한 정보를 수집했습니다. 추가 명령어 없이 최종 리포트를 JSON으로 제공해주세요."),
+        AIMessage(content=JSON_PREFILL),
+    ]
+    async with llm_semaphore:
+        response = await bound_model(RESEARCH_TEMPERATURE).ainvoke(conversation)
+    log_cache_usage("Research", response)
+
+    report = extract_json(JSON_PREFILL + extract_text(response))
+    if report and "summary" in report and "findings" in report:
+        return copy.deepcopy(report)
+    return None
+
+
+async def research_node(state: AgentState) -> AgentState:
     """
     Research 노드: 정보 수집 (JSON 기반 명령어 방식)
+    정보 조회는 자연어 답변으로 종료, 배포 분석은 리포트 JSON을 research_data에 저장
     """
-    messages = state["messages"]
     request_type = state.get("request_type", "deployment_decision")
+    cache_ttl = INFORMATION_CACHE_TTL if request_type == "information_query" else DEPLOYMENT_CACHE_TTL
     task_plan = state.get("task_plan") or {}
     research_needed = task_plan.get("research_needed", []) if isinstance(task_plan, dict) else []
 
-    # 사용자 원래 요청 찾기
-    user_message = None
-    for msg in reversed(messages):
-        if msg.get("role") == "user":
-            user_message = msg.get("content", "")
-            break
+    # 사용자 원래 요청
+    user_message = get_user_request(state)
 
     # 연구 요청 구성
     if request_type == "information_query":
@@ -94,6 +372,9 @@ def research_node(state: AgentState) -> AgentState:
     elif research_needed:
         # 배포 결정 모드: Planning의 지시 따름
         research_request = f"다음 정보를 수집해주세요:\n" + "\n".join(f"- {item}" for item in research_needed)
+        # Planning과 동시에 수집한 기본 정보가 있으면 같은 명령어를 다시 실행하지 않도록 전달
+        if state.get("cluster_probe"):
+            research_request += f"\n\n이미 수집된 기본 클러스터 정보 (같은 명령어는 다시 실행하지 마세요):\n\n{state['cluster_probe']}"
     else:
         # 기본 모드
         if user_message:
@@ -101,15 +382,29 @@ def research_node(state: AgentState) -> AgentState:
         else:
             research_request = "현재 시스템 상태를 분석하고 필요한 정보를 수집해주세요."
     
+    # 반복마다 그대로인 초기 요청에 두 번째 cache breakpoint 지정
+    # (두 번째 반복부터 system + 초기 요청까지 캐시에서 읽히고 최신 결과만 새로 처리)
+    request_message = HumanMessage(content=[
+        {"type": "text", "text": research_request, "cache_control": {"type": "ephemeral"}}
+    ])
+
+    # 반복마다 그대로인 앞부분 (system + 초기 요청), 루프 전에 한 번만 구성
+    conversation_prefix = (RESEARCH_SYSTEM, request_message)
+
     # 대화 히스토리 (도구 실행 결과 포함)
-    conversation = [
-        SystemMessage(content=RESEARCH_PROMPT),
-        HumanMessage(content=research_request)
-    ]
+    conversation = list(conversation_prefix)
     
-    tool_outputs = []
+    # 이번 Research 실행에서 이미 실행한 명령어 결과 (command_key → 결과)
+    executed_commands = {}
+
+    # 반복별 명령어 결과 (오래된 것부터 밀려나도록 길이 제한)
+    tool_outputs = deque(maxlen=MAX_TOOL_OUTPUTS)
     max_iterations = 2
     iteration = 0
+    # 응답 앞부분을 미리 채운 assistant 메시지 (Anthropic prefill, 빈 문자열이면 사용 안 함)
+    prefill = ""
+    # 배포 분석에서 충분한 출력을 모아 반복을 일찍 끝냈는지 여부
+    enough_output = False
     
     while iteration < max_iterations:
         iteration += 1
@@ -117,9 +412,21 @@ def research_node(state: AgentState) -> AgentState:
         print(f"Research Agent - Iteration {iteration}/{max_iterations}")
         print(f"{'='*80}")
         
-        # Claude 호출
-        response = claude_research.invoke(conversation)
-        response_text = response.content
+        # Claude 호출 (스트리밍: 명령어/리포트 JSON이 닫히면 뒤따르는 설명은 기다리지 않고 중단)
+        response = None
+        scanner = ReplyScanner(prefill)
+        async with llm_semaphore:
+            stream = bound_model(RESEARCH_TEMPERATURE).astream(conversation)
+            try:
+                async for chunk in stream:
+                    response = chunk if response is None else response + chunk
+                    if scanner.feed(extract_text(chunk)):
+                        break
+            finally:
+                # 조기 종료 시에도 HTTP 스트림을 세마포어 반환 전에 닫음
+                await stream.aclose()
+        log_cache_usage("Research", response)
+        response_text = prefill + extract_text(response)
         
         print(f"Response: {response_text[:500]}...")
         print(f"\n📝 Full Response:\n{response_text}\n")  # 디버깅용 전체 응답 출력
@@ -128,112 +435,100 @@ def research_node(state: AgentState) -> AgentState:
         commands_executed = False
         is_final_answer = False
 
-        # 방법 1: ```json ... ``` 블록에서 추출
-        json_match = re.search(r'```json\s*(\{.*?\})\s*```', response_text, re.DOTALL)
-        if not json_match:
-            # 방법 2: 단순 {...} 블록 추출
-            json_match = re.search(r'(\{[^{}]*"commands"[^{}]*\[.*?\][^{}]*\})', response_text, re.DOTALL)
-
-        if json_match:
-            try:
-                commands_data = json.loads(json_match.group(1))
+        # JSON 명령어/최종 리포트 추출 (```json 블록 우선, 없으면 본문의 첫 JSON 객체)
+        commands_data = extract_json(response_text)
+        if commands_data:
+            # commands가 있으면 실행
+            if "commands" in commands_data and commands_data["commands"]:
+                commands_executed = True
+                # 형식 검증 후 서로 독립적인 명령어들을 동시에 실행 (결과 순서는 요청 순서 유지)
+                specs = []
+                for cmd_spec in commands_data["commands"][:2]:  # 최대 2개까지만 (토큰 절약)
+                    parsed = parse_command_spec(cmd_spec)
+                    if not parsed:
+                        print(f"⚠️ 잘못된 명령어 형식 무시: {str(cmd_spec)[:80]}")
+                        continue
+                    specs.append(parsed)
+                merged = merge_kubectl_gets(specs)
+                results = await execute_specs(merged, executed_commands, cache_ttl)
+
+                # 합친 조회가 실패하면 (리소스 타입 하나가 없으면 전체가 실패) 원래 명령어를 따로 실행
+                if merged is not specs and command_failed(results[0]):
+                    print("⚠️ 합친 kubectl get 실패 - 명령어별로 다시 실행")
+                    results = await execute_specs(specs, executed_commands, cache_ttl)
+
+                # 결과를 대화에 추가 (최신 것만 유지)
+                results_text = "\n\n".join(results)
+                tool_outputs.append(results_text)
+
+                # 배포 분석: 수집한 출력이 충분히 크면 추가 명령어를 요청하지 않고
+                # 반복 종료 후 최종 리포트 정리만 요청
+                if request_type != "information_query":
+                    collected = sum(len(output) for output in tool_outputs)
+                    if collected > ENOUGH_OUTPUT_CHARS:
+                        print(f"\n⚡ 출력 {collected}자 수집 - 추가 명령어 요청 생략")
+                        enough_output = True
+                        break
+
+                # 요청 유형에 따라 다른 지시
+                if request_type == "information_query":
+                    # 정보 조회: 자연어로 답변 지시
+                    next_instruction = f"명령어 실행 결과:\n\n{results_text}\n\n**이제 위 결과를 바탕으로 사용자의 질문에 자연스러운 한국어로 답변해주세요. JSON이 아닌 일반 문장으로 작성하세요. 핵심 정보만 간결하게 전달하세요.**"
+                else:
+                    # 배포 분석: 선택권 제공
+                    next_instruction = f"명령어 실행 결과:\n\n{results_text}\n\n계속 정보가 필요하면 추가 명령어를 요청하고, 충분한 정보를 수집했으면 최종 리포트를 JSON으로 제공해주세요."
+
+                # 전체 히스토리 대신 시스템 프롬프트 + 초기 요청 + 최신 결과만 유지
+                conversation = [*conversation_prefix, HumanMessage(content=next_instruction)]
+                if request_type != "information_query":
+                    # 배포 분석의 다음 응답은 항상 JSON (추가 명령어 또는 최종 리포트)
+                    # 응답을 "{"로 시작하게 채워두면 설명 문장 없이 바로 파싱 가능한 JSON이 옴
+                    prefill = JSON_PREFILL
+                    conversation.append(AIMessage(content=prefill))
+
+                continue  # 다음 반복으로
                 
-                # commands가 있으면 실행
-                if "commands" in commands_data and commands_data["commands"]:
-                    commands_executed = True
-                    results = []
-                    
-                    for cmd_spec in commands_data["commands"][:2]:  # 최대 2개까지만 (토큰 절약)
-                        tool_name = cmd_spec.get("tool", "execute_bash")
-                        command = cmd_spec.get("command", "")
-                        use_sudo = cmd_spec.get("use_sudo", False)
-                        
-                        if not command:
-                            continue
-                        
-                        print(f"\n🔧 Executing: {tool_name}('{command[:80]}...')")
-                        
-                        # 도구 실행
-                        try:
-                            from tools.bash_tool import execute_bash, execute_host
-                            
-                            if tool_name == "execute_host":
-                                result = execute_host.invoke({"command": command, "use_sudo": use_sudo})
-                            else:
-                                result = execute_bash.invoke({"command": command})
-                            
-                            results.append(f"Command: {command}\nResult: {result}")
-                            print(f"✅ Success")
-                            
-                        except Exception as e:
-                            error_msg = f"❌ Error: {str(e)}"
-                            results.append(f"Command: {command}\nResult: {error_msg}")
-                            print(error_msg)
-                    
-                    # 결과를 대화에 추가 (최신 것만 유지)
-                    results_text = "\n\n".join(results)
-                    tool_outputs.append(results_text)
-
-                    # 요청 유형에 따라 다른 지시
-                    if request_type == "information_query":
-                        # 정보 조회: 자연어로 답변 지시
-                        next_instruction = f"명령어 실행 결과:\n\n{results_text}\n\n**이제 위 결과를 바탕으로 사용자의 질문에 자연스러운 한국어로 답변해주세요. JSON이 아닌 일반 문장으로 작성하세요. 핵심 정보만 간결하게 전달하세요.**"
+            # 최종 리포트인 경우
+            elif "summary" in commands_data and "findings" in commands_data:
+                print("\n✅ 최종 리포트 수신")
+                is_final_answer = True
+
+                # 요청 유형에 따라 다른 포맷
+                if request_type == "information_query":
+                    # 정보 조회: result 필드가 있으면 그것을 자연어 답변으로 사용
+                    result = commands_data.get("result", "")
+
+                    if result:
+                        # result가 있으면 그대로 사용 (자연어 답변)
+                        final_content = result.strip()
                     else:
-                        # 배포 분석: 선택권 제공
-                        next_instruction = f"명령어 실행 결과:\n\n{results_text}\n\n계속 정보가 필요하면 추가 명령어를 요청하고, 충분한 정보를 수집했으면 최종 리포트를 JSON으로 제공해주세요."
-
-                    # 전체 히스토리 대신 시스템 프롬프트 + 초기 요청 + 최신 결과만 유지
-                    conversation = [
-                        SystemMessage(content=RESEARCH_PROMPT),
-                        HumanMessage(content=research_request),
-                        HumanMessage(content=next_instruction)
-                    ]
-
-                    continue  # 다음 반복으로
-                    
-                # 최종 리포트인 경우
-                elif "summary" in commands_data and "findings" in commands_data:
-                    print("\n✅ 최종 리포트 수신")
-                    is_final_answer = True
-
-                    # 요청 유형에 따라 다른 포맷
-                    if request_type == "information_query":
-                        # 정보 조회: result 필드가 있으면 그것을 자연어 답변으로 사용
-                        result = commands_data.get("result", "")
-
-                        if result:
-                            # result가 있으면 그대로 사용 (자연어 답변)
-                            final_content = result.strip()
-                        else:
-                            # result가 없으면 findings에서 추출
-                            findings = commands_data.get("findings", [])
-                            summary_parts = []
-                            for finding in findings[:3]:
-                                data = finding.get("data", "")
-                                if data:
-                                    summary_parts.append(data)
-                            final_content = "\n".join(summary_parts) if summary_parts else "정보를 찾을 수 없습니다."
-
-                        # 정보 조회는 바로 종료
-                        state["current_agent"] = "end"
+                        # result가 없으면 findings에서 추출
+                        findings = commands_data.get("findings", [])
+                        summary_parts = []
+                        for finding in findings[:3]:
+                            data = finding.get("data", "")
+                            if data:
+                                summary_parts.append(data)
+                        final_content = "\n".join(summary_parts) if summary_parts else "정보를 찾을 수 없습니다."
+
+                    # 정보 조회는 바로 종료
+                    state["current_agent"] = "end"
+
+                else:
+                    # 배포 분석: 간단한 상태만 표시 (Decision agent가 상세 결과 표시)
+                    final_content = "✅ 분석 완료"
+
+                    # 배포 분석은 orchestrator로 돌아감 (decision으로 이동)
+                    state["current_agent"] = "orchestrator"
+
+                state["research_data"] = copy.deepcopy(commands_data)
+                state["messages"].append({
+                    "role": "research",
+                    "content": final_content
+                })
+                attach_cluster_probe(state)
+                return state
 
-                    else:
-                        # 배포 분석: 간단한 상태만 표시 (Decision agent가 상세 결과 표시)
-                        final_content = "✅ 분석 완료"
-
-                        # 배포 분석은 orchestrator로 돌아감 (decision으로 이동)
-                        state["current_agent"] = "orchestrator"
-
-                    state["research_data"] = commands_data
-                    state["messages"].append({
-                        "role": "research",
-                        "content": final_content
-                    })
-                    return state
-                    
-            except json.JSONDecodeError as e:
-                print(f"⚠️ JSON 파싱 실패: {e}")
-        
         # 명령어도 없고 최종 리포트도 아니면 자연어 답변으로 간주
         if not commands_executed and not is_final_answer:
             print("\n✅ 자연어 답변 수신")
@@ -247,7 +542,7 @@ def research_node(state: AgentState) -> AgentState:
                 else:
                     # 만약 JSON이면 파싱해서 표시
                     try:
-                        data = json.loads(response_text)
+                        data = orjson.loads(response_text)
                         if "result" in data:
                             content = data["result"]
                         else:
@@ -270,10 +565,11 @@ def research_node(state: AgentState) -> AgentState:
                 "role": "research",
                 "content": content
             })
+            attach_cluster_probe(state)
             return state
     
-    # 최대 반복 도달
-    print(f"\n⚠️ 최대 반복 횟수 도달 ({max_iterations})")
+    # 최대 반복 도달 (또는 충분한 출력 수집)
+    print(f"\n⚠️ 반복 종료 ({iteration}/{max_iterations})")
 
     # 요청 유형에 따라 다른 출력
     if request_type == "information_query":
@@ -281,9 +577,15 @@ def research_node(state: AgentState) -> AgentState:
         if tool_outputs:
             outputs_text = "\n\n".join(tool_outputs)
 
-            # Claude에게 결과 해석 요청
-            print("\n📝 결과 해석 요청 중...")
-            interpretation_prompt = f"""수집된 정보를 바탕으로 사용자 질문에 답변해주세요.
+            # 마지막 반복에서 실행한 명령어 하나의 짧은 출력이면 그 자체가 답 (비밀번호, 버전 등): 해석 호출 생략
+            answer = trivial_answer(tool_outputs[-1])
+            if answer:
+                print("\n⚡ 짧은 단일 결과 - 결과 해석 생략")
+                content = f"✅ 조회 완료\n\n{answer}"
+            else:
+                # Claude에게 결과 해석 요청
+                print("\n📝 결과 해석 요청 중...")
+                interpretation_prompt = f"""수집된 정보를 바탕으로 사용자 질문에 답변해주세요.
 
 **사용자 질문:** {user_message}
 
@@ -298,11 +600,12 @@ def research_node(state: AgentState) -> AgentState:
 
 답변:"""
 
-            interpretation_response = claude_research.invoke([
-                HumanMessage(content=interpretation_prompt)
-            ])
+                async with llm_semaphore:
+                    interpretation_response = await bound_model(RESEARCH_TEMPERATURE).ainvoke([
+                        HumanMessage(content=interpretation_prompt)
+                    ])
 
-            content = f"✅ 조회 완료\n\n{interpretation_response.content}"
+                content = f"✅ 조회 완료\n\n{extract_text(interpretation_response)}"
 
             state["research_data"] = {
                 "summary": "정보 수집 완료",
@@ -322,7 +625,12 @@ def research_node(state: AgentState) -> AgentState:
         content = "✅ 분석 완료"
         if tool_outputs:
             outputs_text = "\n\n".join(tool_outputs)
-            state["research_data"] = {
+            report = None
+            if enough_output:
+                # 충분한 출력으로 일찍 끝낸 경우에도 구조화된 리포트는 받아서 전달
+                print("\n📝 최종 리포트 요청 중...")
+                report = await request_final_report(conversation_prefix, outputs_text)
+            state["research_data"] = report or {
                 "summary": "정보 수집 완료",
                 "findings": [{"category": "클러스터 정보", "data": outputs_text}],
                 "recommendations": []
@@ -340,4 +648,5 @@ def research_node(state: AgentState) -> AgentState:
         "content": content
     })
 
+    attach_cluster_probe(state)
     return state
@@ -8,11 +8,26 @@ from typing import TypedDict, Optional
 class AgentState(TypedDict):
     """에이전트 간 공유되는 상태"""
     messages: list                      # 대화 메시지 이력
+    user_request: Optional[str]         # 사용자 원래 요청 (messages[0]에서 한 번만 추출)
     current_agent: str                  # 현재 활성 에이전트
     request_type: Optional[str]         # 요청 유형: "information_query" or "deployment_decision"
     task_plan: Optional[dict]           # Planning Agent 출력 (폴더 구조, YAML 설계)
+    cluster_probe: Optional[str]        # Planning과 동시에 수집한 기본 클러스터 정보 (Research가 재사용)
     research_data: Optional[dict]       # Research Agent 출력 (K8s 클러스터 상태)
     decision_report: Optional[dict]     # Decision Agent 출력 (추천/비추천 결정)
     implementation_prompt: Optional[str] # Prompt Generator 출력 (구현 가이드)
     iteration_count: int                # 반복 횟수 (최대 2회)
     error: Optional[str]                # 에러 메시지
+
+
+def get_user_request(state: AgentState) -> str:
+    """
+    사용자 원래 요청
+    처음 호출될 때 messages[0]에서 꺼내 state에 저장하고 이후에는 그대로 재사용
+    """
+    user_request = state.get("user_request")
+    if user_request is None:
+        messages = state["messages"]
+        user_request = messages[0].get("content", "") if messages else ""
+        state["user_request"] = user_request
+    return user_request
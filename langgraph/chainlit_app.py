@@ -4,23 +4,58 @@ Chainlit UI for MAS Platform
 import chainlit as cl
 from workflow import mas_graph
 from agents import AgentState
+from agents.llm import extract_text
+from tools import warm_up_all_sessions
 import os
 from dotenv import load_dotenv
 import contextvars
+import re
 
 load_dotenv()
 
+# chainlit run은 앱 모듈을 import한 뒤 이벤트 루프를 만들므로,
+# import 시점에 uvloop 정책을 설치해야 서버 루프가 uvloop로 동작함
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+# 사용자에게 보여주지 않을 내부 라우팅 라인 (NEXT_AGENT, REASON 등)
+ROUTING_LINE_RE = re.compile(r"^[^\S\n]*(?:NEXT_AGENT|REASON|MESSAGE).*\n?", re.MULTILINE)
+
+# 사용자에게 보여줄 에이전트별 아이콘/이름
+AGENT_ICONS = {
+    "planning": "📋",
+    "research": "🔍",
+    "decision": "💡",
+    "prompt_generator": "📝"
+}
+
+AGENT_DISPLAY_NAMES = {
+    "planning": "도구 요구사항 분석",
+    "research": "클러스터 상태 분석",
+    "decision": "의사결정 분석",
+    "prompt_generator": "구현 가이드 생성"
+}
+
+# 최종 결과를 기다리지 않고 LLM 토큰을 그대로 흘려보내는 에이전트 (출력이 곧 결과물)
+STREAMED_AGENTS = {"prompt_generator"}
+
 # Chainlit의 local_steps ContextVar 초기화
 try:
     from chainlit.step import local_steps
     local_steps.set([])
 except:
-    pass
+    local_steps = None
 
 
 @cl.on_chat_start
 async def start():
     """채팅 시작 시"""
+    # 사용자가 입력하는 동안 모든 도구 워커의 bash 세션을 미리 준비 (첫 채팅에서 한 번)
+    warm_up_all_sessions()
+
     await cl.Message(
         content="☸️ **K8s 인프라 분석 & 의사결정 시스템**에 오신 것을 환영합니다!\n\n"
                 "클러스터를 분석하고, 도구 도입 여부를 결정해드립니다.\n\n"
@@ -44,20 +79,19 @@ async def start():
 async def main(message: cl.Message):
     """메시지 수신 시"""
     
-    # local_steps ContextVar 초기화
-    try:
-        from chainlit.step import local_steps
+    # local_steps ContextVar 초기화 (모듈 로드 시 import한 것을 재사용)
+    if local_steps is not None:
         local_steps.set([])
-    except:
-        pass
     
     try:
         # 초기 상태
         initial_state: AgentState = {
             "messages": [{"role": "user", "content": message.content}],
+            "user_request": message.content,
             "current_agent": "orchestrator",
             "request_type": None,  # Orchestrator가 결정
             "task_plan": None,
+            "cluster_probe": None,
             "research_data": None,
             "decision_report": None,
             "implementation_prompt": None,
@@ -73,8 +107,26 @@ async def main(message: cl.Message):
         status_msg = cl.Message(content="⏳ 작업 중...")
         await status_msg.send()
 
+        # 토큰 단위로 이미 화면에 출력한 에이전트 (updates 이벤트에서 다시 붙이지 않음)
+        streamed_agents = set()
+
         # MAS 그래프 실행
-        async for event in mas_graph.astream(initial_state):
+        # updates: 노드 완료 시 상태, messages: 노드 안의 LLM 토큰 스트림
+        async for mode, event in mas_graph.astream(initial_state, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                chunk, metadata = event
+                agent_name = metadata.get("langgraph_node")
+                if agent_name in STREAMED_AGENTS:
+                    if agent_name not in streamed_agents:
+                        streamed_agents.add(agent_name)
+                        await response_msg.stream_token(
+                            f"\n\n{AGENT_ICONS[agent_name]} **{AGENT_DISPLAY_NAMES[agent_name]}**:\n"
+                        )
+                    token = extract_text(chunk)
+                    if token:
+                        await response_msg.stream_token(token)
+                continue
+
             for node_name, state in event.items():
                 if node_name != "__end__":
                     last_message = state["messages"][-1]
@@ -82,35 +134,15 @@ async def main(message: cl.Message):
                     agent_content = last_message["content"]
 
                     # 사용자에게 보여줄 에이전트만 필터링
-                    user_facing_agents = ["planning", "research", "decision", "prompt_generator"]
-
-                    if agent_name in user_facing_agents:
-                        # 에이전트별 아이콘
-                        agent_icons = {
-                            "planning": "📋",
-                            "research": "🔍",
-                            "decision": "💡",
-                            "prompt_generator": "📝"
-                        }
-
-                        agent_display_names = {
-                            "planning": "도구 요구사항 분석",
-                            "research": "클러스터 상태 분석",
-                            "decision": "의사결정 분석",
-                            "prompt_generator": "구현 가이드 생성"
-                        }
+                    if agent_name in AGENT_DISPLAY_NAMES:
+                        if agent_name in streamed_agents:
+                            continue  # 이미 토큰 단위로 출력됨
 
-                        icon = agent_icons.get(agent_name, "🤖")
-                        display_name = agent_display_names.get(agent_name, agent_name)
+                        icon = AGENT_ICONS.get(agent_name, "🤖")
+                        display_name = AGENT_DISPLAY_NAMES.get(agent_name, agent_name)
 
                         # 내부 라우팅 정보 제거 (NEXT_AGENT, REASON 등)
-                        cleaned_content = agent_content
-                        for keyword in ["NEXT_AGENT:", "REASON:", "MESSAGE:"]:
-                            if keyword in cleaned_content:
-                                # 라우팅 정보가 포함된 경우 해당 부분 제거
-                                lines = cleaned_content.split("\n")
-                                cleaned_lines = [line for line in lines if not line.strip().startswith(keyword.replace(":", ""))]
-                                cleaned_content = "\n".join(cleaned_lines)
+                        cleaned_content = ROUTING_LINE_RE.sub("", agent_content)
 
                         # 스트리밍 업데이트
                         response_msg.content += f"\n\n{icon} **{display_name}**:\n{cleaned_content.strip()}"
@@ -0,0 +1,41 @@
+"""
+Orchestrator 규칙 기반 라우팅 테스트
+"""
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("orjson")
+
+from agents.orchestrator import classify_request
+
+
+@pytest.mark.parametrize("user_request", [
+    "현재 메모리 사용량은?",
+    "노드별 CPU 사용률 어때?",
+    "Gitea 로그 분석해줘",
+    "argocd 배포 현황 어때?",
+])
+def test_ambiguous_keywords_are_left_to_router(user_request):
+    # "사용", "분석", "배포" 같은 단어만으로는 도입 결정으로 보내지 않음
+    assert classify_request(user_request) is None
+
+
+@pytest.mark.parametrize("user_request", [
+    "Tekton 도입할까?",
+    "Harbor 설치해야 할까?",
+    "Redis 클러스터 도입 여부 판단해줘",
+])
+def test_deployment_phrases(user_request):
+    assert classify_request(user_request) == "deployment_decision"
+
+
+@pytest.mark.parametrize("user_request", [
+    "PostgreSQL 비밀번호 알려줘",
+    "Secret 목록 보여줘",
+])
+def test_information_phrases(user_request):
+    assert classify_request(user_request) == "information_query"
+
+
+def test_mixed_phrases_are_left_to_router():
+    assert classify_request("Tekton 도입할지 판단에 필요한 노드 목록 보여줘") is None
@@ -1,6 +1,32 @@
 """
 MAS Tools Package
 """
-from .bash_tool import bash_tools, execute_bash, execute_host
+from .bash_tool import (
+    TOOL_REGISTRY,
+    bash_tools,
+    batch_execute,
+    cached_run_tool,
+    execute_bash,
+    execute_host,
+    run_tool,
+    summarize_output,
+    tool_executor,
+    truncate_output,
+    warm_up_all_sessions,
+    warm_up_sessions,
+)
 
-__all__ = ['bash_tools', 'execute_bash', 'execute_host']
+__all__ = [
+    'TOOL_REGISTRY',
+    'bash_tools',
+    'batch_execute',
+    'cached_run_tool',
+    'execute_bash',
+    'execute_host',
+    'run_tool',
+    'summarize_output',
+    'tool_executor',
+    'truncate_output',
+    'warm_up_all_sessions',
+    'warm_up_sessions',
+]
@@ -1,12 +1,261 @@
 """
 Bash 명령어 실행 도구
 """
+import os
+import re
+import selectors
+import shutil
+import signal
 import subprocess
 import shlex
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.tools import tool
+from pydantic import ValidationError
 from typing import Optional
 
 
+# 도구 출력 최대 길이 (LLM 컨텍스트에 넣을 수 있는 수준으로 제한)
+MAX_TOOL_OUTPUT_CHARS = 65536
+
+
+def truncate_output(output: str, limit: int = MAX_TOOL_OUTPUT_CHARS) -> str:
+    """
+    도구 출력이 limit을 넘으면 앞부분만 남기고 잘라냄
+    """
+    if len(output) <= limit:
+        return output
+    return output[:limit] + "\n...[truncated]"
+
+
+def summarize_output(output: str, limit: int = 4096) -> str:
+    """
+    LLM 재입력용으로 출력의 앞/뒤 일부만 남김 (head + tail)
+    """
+    if len(output) <= limit:
+        return output
+    half = limit // 2
+    omitted = len(output) - 2 * half
+    return f"{output[:half]}\n...[{omitted} chars omitted]...\n{output[-half:]}"
+
+
+NSENTER = shutil.which("nsenter") or "/usr/bin/nsenter"
+
+# 세션별 bash 실행 명령
+# Use nsenter to enter host namespaces
+# -t 1: target PID 1 (init process on host)
+# -m: mount namespace
+# -u: UTS namespace (hostname)
+# -n: network namespace
+# -i: IPC namespace
+CONTAINER_SHELL = ("/bin/bash", "--noprofile", "--norc")
+HOST_SHELL = (NSENTER, "-t", "1", "-m", "-u", "-n", "-i", "--", "/bin/bash", "--noprofile", "--norc")
+
+
+class BashSession:
+    """
+    계속 살아있는 bash 프로세스
+    명령어마다 Python 프로세스를 fork하지 않고 stdin으로 명령어를 전달한 뒤
+    sentinel 라인이 나올 때까지 stdout/stderr를 읽음
+    """
+
+    def __init__(self, argv: tuple = CONTAINER_SHELL):
+        self.process = subprocess.Popen(
+            list(argv),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+            start_new_session=True  # 타임아웃 시 프로세스 그룹 전체 종료
+        )
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def close(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.wait()
+
+    def discard_pending(self):
+        """
+        이전 명령어의 sentinel 이후에 도착한 출력(백그라운드 프로세스 등)을 버림
+        세션은 모든 채팅이 공유하므로 다음 명령어 결과 앞에 섞이지 않도록 명령어 전송 전에 호출
+        """
+        with selectors.DefaultSelector() as selector:
+            for stream in (self.process.stdout, self.process.stderr):
+                selector.register(stream, selectors.EVENT_READ)
+            while selector.get_map():
+                ready = selector.select(0)
+                if not ready:
+                    return
+                for key, _ in ready:
+                    if not os.read(key.fd, 65536):
+                        # EOF: 세션이 끝났으면 run()에서 처리
+                        selector.unregister(key.fileobj)
+
+    def run(
+        self,
+        command: str,
+        timeout: int,
+        cwd: Optional[str] = None,
+        max_bytes: int = MAX_TOOL_OUTPUT_CHARS
+    ) -> tuple[str, str, int]:
+        """
+        명령어 실행 후 (stdout, stderr, exit code) 반환
+        명령어는 subshell + eval로 감싸서 cd/exit/문법 오류가 세션에 영향을 주지 않음
+        출력은 스트림별로 max_bytes까지만 보관 (나머지는 읽으면서 버림)
+        """
+        self.discard_pending()
+
+        marker = f"__END_{uuid.uuid4().hex}__".encode()
+        chdir = f"cd {shlex.quote(cwd)} && " if cwd else ""
+        script = (
+            f"( {chdir}eval {shlex.quote(command)} ) < /dev/null\n"
+            f"printf '\\n{marker.decode()}%d\\n' $?\n"
+            f"printf '\\n{marker.decode()}\\n' >&2\n"
+        )
+        data = memoryview(script.encode())
+        while data:
+            data = data[self.process.stdin.write(data):]
+
+        sentinels = {
+            self.process.stdout: re.compile(b"\n" + marker + rb"(\d+)\n"),
+            self.process.stderr: re.compile(b"\n" + marker + b"\n"),
+        }
+        # sentinel 검색을 위해 잘라낸 뒤에도 유지하는 꼬리 길이
+        window = len(marker) + 32
+        buffers = {stream: bytearray() for stream in sentinels}
+        matches = {}
+        truncated = set()
+
+        with selectors.DefaultSelector() as selector:
+            for stream in sentinels:
+                selector.register(stream, selectors.EVENT_READ)
+
+            deadline = time.monotonic() + timeout
+            while len(matches) < len(sentinels):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.close()
+                    raise subprocess.TimeoutExpired(command, timeout)
+
+                for key, _ in selector.select(remaining):
+                    chunk = os.read(key.fd, 65536)
+                    if not chunk:
+                        self.close()
+                        raise RuntimeError("bash session terminated unexpectedly")
+
+                    stream = key.fileobj
+                    if stream in matches:
+                        continue  # sentinel 이후 출력은 이번 결과에 넣지 않음 (다음 run()에서 버림)
+
+                    buffer = buffers[stream]
+                    # 새로 읽은 부분 근처만 sentinel 검색
+                    start = max(0, len(buffer) - window)
+                    buffer += chunk
+                    if len(buffer) > max_bytes + window:
+                        # 앞부분 max_bytes와 sentinel 검색용 꼬리만 남기고 중간은 버림
+                        del buffer[max_bytes:len(buffer) - window]
+                        truncated.add(stream)
+                        start = max_bytes
+
+                    match = sentinels[stream].search(buffer, start)
+                    if match:
+                        matches[stream] = match
+
+        def decode(stream) -> str:
+            buffer = buffers[stream]
+            if stream in truncated:
+                return buffer[:max_bytes].decode("utf-8", "replace") + "\n...[truncated]"
+            return buffer[:matches[stream].start()].decode("utf-8", "replace")
+
+        return (
+            decode(self.process.stdout),
+            decode(self.process.stderr),
+            int(matches[self.process.stdout].group(1))
+        )
+
+
+# LangGraph worker 스레드마다 컨테이너/호스트 bash 세션을 하나씩 유지
+_local = threading.local()
+
+
+def _session(argv: tuple) -> BashSession:
+    sessions = _local.__dict__.setdefault("sessions", {})
+    session = sessions.get(argv)
+    if session is None or not session.alive():
+        session = sessions[argv] = BashSession(argv)
+    return session
+
+
+def warm_up_sessions():
+    """
+    현재 스레드의 컨테이너/호스트 bash 세션을 미리 띄워둠
+    (첫 도구 호출이 bash/nsenter 시작 비용을 치르지 않도록 워커 스레드에서 실행)
+    """
+    for argv in (CONTAINER_SHELL, HOST_SHELL):
+        try:
+            _session(argv)
+        except Exception as e:
+            print(f"⚠️ bash 세션 준비 실패: {e}")
+
+
+# 도구 실행 풀의 워커 수
+TOOL_WORKERS = 8
+
+# 에이전트들이 도구 호출을 동시에 실행할 때 쓰는 공용 스레드 풀
+# 워커 스레드가 계속 살아있으므로 스레드별 bash 세션도 재사용됨
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="mas-tool")
+
+# batch_execute 전용 풀 (tool_executor 안에서 같은 풀을 기다리면 교착될 수 있음)
+batch_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="mas-batch")
+
+# 워커가 모두 모일 때까지 기다리는 최대 시간 (초): 풀이 다른 작업으로 바쁘면 포기
+WARM_UP_TIMEOUT = 10
+
+warm_up_lock = threading.Lock()
+warmed_up = False
+
+
+def warm_up_pool(executor: ThreadPoolExecutor):
+    """
+    풀의 모든 워커 스레드에서 warm_up_sessions 실행
+    세션이 스레드별이므로 각 작업이 Barrier에서 기다려 서로 다른 스레드를 차지하게 함
+    (먼저 끝난 스레드가 다음 작업을 또 가져가면 일부 워커만 준비됨)
+    """
+    barrier = threading.Barrier(TOOL_WORKERS)
+
+    def warm_up():
+        warm_up_sessions()
+        try:
+            barrier.wait(WARM_UP_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
+
+    for _ in range(TOOL_WORKERS):
+        executor.submit(warm_up)
+
+
+def warm_up_all_sessions():
+    """
+    tool_executor와 batch_executor의 모든 워커에 bash 세션을 미리 띄움 (프로세스당 한 번, 기다리지 않음)
+    이후 죽은 세션은 _session()이 다음 호출에서 다시 만듦
+    """
+    global warmed_up
+    with warm_up_lock:
+        if warmed_up:
+            return
+        warmed_up = True
+    for executor in (tool_executor, batch_executor):
+        warm_up_pool(executor)
+
+
 @tool
 def execute_bash(command: str, timeout: int = 30, cwd: Optional[str] = None) -> str:
     """
@@ -26,22 +275,15 @@ def execute_bash(command: str, timeout: int = 30, cwd: Optional[str] = None) ->
         - execute_bash("curl -s http://prometheus:9090/api/v1/query?query=up")
     """
     try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            cwd=cwd
-        )
+        stdout, stderr, returncode = _session(CONTAINER_SHELL).run(command, timeout, cwd)
 
         # Combine stdout and stderr
-        output = result.stdout
-        if result.stderr:
-            output += f"\n[STDERR]:\n{result.stderr}"
+        output = stdout
+        if stderr:
+            output += f"\n[STDERR]:\n{stderr}"
 
-        if result.returncode != 0:
-            return f"❌ Command failed (exit code {result.returncode}):\n{output}"
+        if returncode != 0:
+            return f"❌ Command failed (exit code {returncode}):\n{output}"
 
         return f"✅ Command executed successfully:\n{output}"
 
@@ -85,40 +327,29 @@ def execute_host(command: str, timeout: int = 30, use_sudo: bool = False) -> str
         - execute_host("psql -U bluemayne -h postgresql-primary.postgresql.svc.cluster.local -d postgres -c 'SELECT version()'")
     """
     try:
-        # Use nsenter to enter host namespaces
-        # -t 1: target PID 1 (init process on host)
-        # -m: mount namespace
-        # -u: UTS namespace (hostname)
-        # -n: network namespace
-        # -i: IPC namespace
+        # 호스트 네임스페이스(nsenter)에서 계속 실행 중인 bash 세션에 명령어 전달
+        # 명령어마다 nsenter 프로세스 생성과 setns를 반복하지 않음
         # Run as ubuntu user to avoid git "dubious ownership" errors
         # Use 'su ubuntu -c' (without -) to preserve current directory context
         # This allows commands to work from SSH initial directory
         if use_sudo:
             # For sudo commands, run directly with sudo
-            # Use shlex.quote to safely quote the command while preserving shell expansion
-            nsenter_command = f"nsenter -t 1 -m -u -n -i -- sh -c {shlex.quote(f'sudo {command}')}"
+            host_command = f"sudo {command}"
         else:
             # For regular commands, run as ubuntu user
             # Use 'su ubuntu -c' (not 'su - ubuntu -c') to preserve current directory
             # This matches SSH behavior where you start from the initial directory
-            nsenter_command = f"nsenter -t 1 -m -u -n -i -- su ubuntu -c {shlex.quote(command)}"
-
-        result = subprocess.run(
-            nsenter_command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
+            host_command = f"su ubuntu -c {shlex.quote(command)}"
+
+        stdout, stderr, returncode = _session(HOST_SHELL).run(host_command, timeout)
 
         # Combine stdout and stderr
-        output = result.stdout
-        if result.stderr:
-            output += f"\n[STDERR]:\n{result.stderr}"
+        output = stdout
+        if stderr:
+            output += f"\n[STDERR]:\n{stderr}"
 
-        if result.returncode != 0:
-            return f"❌ Host command failed (exit code {result.returncode}):\n{output}"
+        if returncode != 0:
+            return f"❌ Host command failed (exit code {returncode}):\n{output}"
 
         return f"✅ Host command executed successfully:\n{output}"
 
@@ -128,5 +359,134 @@ def execute_host(command: str, timeout: int = 30, use_sudo: bool = False) -> str
         return f"❌ Error executing host command: {str(e)}"
 
 
-# Export both tools
-bash_tools = [execute_bash, execute_host]
+@tool
+def batch_execute(invocations: list[dict], timeout: int = 30) -> str:
+    """
+    Execute several INDEPENDENT commands at once, in parallel.
+
+    Prefer this over multiple execute_bash/execute_host calls when you have
+    2 or more commands that do not depend on each other's results.
+    Commands run concurrently, so their order must not matter
+    (no shared temp files, no command that needs another one's output).
+
+    Args:
+        invocations: List of {"tool": "execute_host" | "execute_bash", "command": str, "use_sudo": bool}
+        timeout: Per-command timeout in seconds (default: 30)
+
+    Returns:
+        Output of every command, in the given order
+
+    Examples:
+        - batch_execute([
+            {"tool": "execute_host", "command": "kubectl get pods -A", "use_sudo": True},
+            {"tool": "execute_host", "command": "kubectl get svc -A", "use_sudo": True}
+          ])
+    """
+    # 배치 안에서 실행할 수 있는 도구 (알 수 없는 이름은 execute_bash로 바꾸지 않고 오류로 반환)
+    tools = {"execute_bash": execute_bash, "execute_host": execute_host}
+
+    def run(invocation) -> str:
+        if not isinstance(invocation, dict) or not invocation.get("command"):
+            return f"❌ Invalid invocation: {invocation}"
+        tool_name = invocation.get("tool", "execute_bash")
+        selected = tools.get(tool_name)
+        if selected is None:
+            return f"❌ Unknown tool: {tool_name}"
+        args = {key: value for key, value in invocation.items() if key != "tool"}
+        args.setdefault("timeout", timeout)
+        return call_tool(selected, args)
+
+    results = batch_executor.map(run, invocations)
+    return "\n\n".join(
+        f"[{i}] {invocation.get('command', '') if isinstance(invocation, dict) else ''}\n{result}"
+        for i, (invocation, result) in enumerate(zip(invocations, results), 1)
+    )
+
+
+# Export all tools
+bash_tools = [execute_bash, execute_host, batch_execute]
+
+# 도구 이름 → 도구 (알 수 없는 이름은 execute_bash로 처리)
+TOOL_REGISTRY = {tool.name: tool for tool in bash_tools}
+
+
+def call_tool(selected, tool_args: dict) -> str:
+    """
+    인자를 도구 스키마로 검증/변환한 뒤 ("60" → 60, "false" → False) 원래 함수를 바로 호출
+    콜백 등 LangChain 도구 래퍼의 나머지 처리는 거치지 않음
+    """
+    try:
+        args = selected.args_schema(**tool_args).model_dump()
+    except ValidationError as e:
+        return f"❌ Invalid arguments for {selected.name}: {e}"
+    invalidate_command_cache(str(args.get("command", "")))
+    return selected.func(**args)
+
+
+def run_tool(tool_name: str, tool_args: dict) -> str:
+    """
+    tool_name에 해당하는 도구를 실행하고 출력 길이를 제한해 반환
+    """
+    return truncate_output(call_tool(TOOL_REGISTRY.get(tool_name, execute_bash), tool_args))
+
+
+# 읽기 전용 kubectl 명령어 결과 캐시 (LRU + TTL)
+# 같은 진단 명령어(kubectl get nodes 등)를 반복/에이전트 간에 다시 실행하지 않도록 함
+COMMAND_CACHE_SIZE = 64
+command_cache = OrderedDict()
+command_cache_lock = threading.Lock()
+
+# 결과를 캐시해도 되는 명령어: 파이프/리다이렉트/명령어 연결 없는 kubectl 조회
+READ_ONLY_COMMAND_RE = re.compile(r"^\s*kubectl\s+(?:get|describe|top|version|api-resources|cluster-info)\b[^;&|<>`$]*$")
+
+# 클러스터 수명 동안 사실상 바뀌지 않는 메타데이터 (버전, API 리소스 목록)
+# 요청마다 다시 조회하지 않도록 호출자가 준 ttl보다 길게 캐시
+# 노드/네임스페이스 등 상태성 조회는 호출자 ttl을 그대로 따름
+DISCOVERY_COMMAND_RE = re.compile(r"^\s*kubectl\s+(?:version|api-resources|api-versions)\b[^;&|<>`$]*$")
+DISCOVERY_CACHE_TTL = 300
+
+# 클러스터를 다루는 도구: 읽기 전용 조회가 아니면 상태를 바꿀 수 있다고 보고 캐시를 비움
+# (kubectl -n x apply, helm install, kustomize | kubectl apply 등 플래그/파이프 형태도 포함)
+CLUSTER_TOOL_RE = re.compile(r"\b(?:kubectl|helm|kustomize)\b")
+
+
+def invalidate_command_cache(command: str):
+    """
+    읽기 전용이 아닌 kubectl/helm 명령어면 캐시된 조회 결과를 모두 버림
+    """
+    if CLUSTER_TOOL_RE.search(command) and not READ_ONLY_COMMAND_RE.match(command):
+        with command_cache_lock:
+            command_cache.clear()
+
+
+def cached_run_tool(tool_name: str, tool_args: dict, ttl: float) -> str:
+    """
+    읽기 전용 kubectl 명령어는 ttl초 동안 캐시된 결과 반환, 나머지는 run_tool 그대로 실행
+    """
+    command = tool_args.get("command", "")
+    if not READ_ONLY_COMMAND_RE.match(command):
+        return run_tool(tool_name, tool_args)
+
+    if DISCOVERY_COMMAND_RE.match(command):
+        ttl = max(ttl, DISCOVERY_CACHE_TTL)
+
+    key = (tool_name, command.strip(), tool_args.get("use_sudo") is True)
+    now = time.monotonic()
+    with command_cache_lock:
+        entry = command_cache.get(key)
+        if entry is not None and now - entry[0] < ttl:
+            command_cache.move_to_end(key)
+            print(f"⚡ Command cache hit: {command[:80]}")
+            return entry[1]
+
+    result = run_tool(tool_name, tool_args)
+    if result.startswith("❌"):
+        # 실패한 결과는 캐시하지 않음 (다음 호출에서 다시 시도)
+        return result
+
+    with command_cache_lock:
+        command_cache[key] = (time.monotonic(), result)
+        command_cache.move_to_end(key)
+        if len(command_cache) > COMMAND_CACHE_SIZE:
+            command_cache.popitem(last=False)
+    return result